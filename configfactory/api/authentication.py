@@ -1,8 +1,107 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from django.utils.translation import ugettext_lazy as _
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
-from configfactory.models import User
+from configfactory.models import Environment, User
+from configfactory.utils import SharedVersionMixin
+
+
+class APIToken:
+    """Authenticated API token."""
+
+    def __init__(self, user: User, environments: OrderedDict, expires: float):
+        self.user = user
+        self.environments = environments
+        self.expires = expires
+
+
+class APITokensHandler(SharedVersionMixin):
+    """Authenticated API tokens handler.
+
+    Tokens are kept in a bounded process memory LRU under their
+    SHA-256 hash together with the user and the aliases and ids
+    of environments the user may view. Any user, environment or
+    permission change bumps the shared version and clears them.
+    """
+
+    cache_prefix = 'api_tokens'
+
+    max_size = 1024
+
+    timeout = 60
+
+    def __init__(self):
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[APIToken]:
+
+        self._sync()
+
+        key = self._make_key(token)
+
+        with self._lock:
+            api_token = self._tokens.get(key)
+            if api_token is None:
+                return None
+            if api_token.expires < time.monotonic():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+
+        return api_token
+
+    def set(self, token: str, user: User) -> APIToken:
+
+        api_token = APIToken(
+            user=user,
+            environments=OrderedDict(
+                Environment.objects.with_user_perms(
+                    user=user,
+                    perms=(
+                        'view_environment',
+                    ),
+                ).values_list('alias', 'pk')
+            ),
+            expires=time.monotonic() + self.timeout
+        )
+
+        with self._lock:
+            self._tokens[self._make_key(token)] = api_token
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+        return api_token
+
+    def get_environments(self, token: str) -> Optional[OrderedDict]:
+        """Return aliases and ids of environments token user may view."""
+        api_token = self.get(token) if token else None
+        if api_token is None:
+            return None
+        return api_token.environments
+
+    def invalidate(self):
+        self._bump_version()
+        with self._lock:
+            self._tokens.clear()
+
+    def _sync(self):
+        if self._check_version():
+            with self._lock:
+                self._tokens.clear()
+
+    def _make_key(self, token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+
+api_tokens = APITokensHandler()
 
 
 class TokenAuthentication(BaseAuthentication):
@@ -18,12 +117,19 @@ class TokenAuthentication(BaseAuthentication):
         else:
             raise AuthenticationFailed(_('Token is required.'))
 
-        try:
-            user = User.objects.active().get(api_token=token)
-        except User.DoesNotExist:
-            raise AuthenticationFailed(_('Invalid token.'))
+        api_token = api_tokens.get(token)
+
+        if api_token is None:
+
+            try:
+                user = User.objects.active().get(api_token=token)
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+
+            if not user.has_api_access:
+                raise AuthenticationFailed(_('User inactive or deleted.'))
 
-        if not user.has_api_access:
-            raise AuthenticationFailed(_('User inactive or deleted.'))
+            api_token = api_tokens.set(token, user)
 
-        return user, token
+        # Do not share cached user state between requests
+        return copy.copy(api_token.user), token
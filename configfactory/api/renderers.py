@@ -0,0 +1,32 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack binary renderer."""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True)
+
+
+def get_settings_renderer_classes() -> tuple:
+    """Return settings renderers, binary ones only if available."""
+
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES)
+
+    if msgpack is not None:
+        renderer_classes += (MessagePackRenderer,)
+
+    return renderer_classes
@@ -8,7 +8,15 @@ urlpatterns = [
         view=views.EnvironmentsAPIView.as_view(),
         name='environments'),
 
+    url(r'^bulk/settings/$',
+        view=views.BulkSettingsAPIView.as_view(),
+        name='bulk_settings'),
+
     url(r'^(?P<alias>[\w-]+)/$',
         view=views.EnvironmentSettingsAPIView.as_view(),
         name='settings'),
+
+    url(r'^(?P<alias>[\w-]+)/watch/$',
+        view=views.EnvironmentSettingsWatchAPIView.as_view(),
+        name='watch_settings'),
 ]
@@ -1,13 +1,26 @@
-from rest_framework.exceptions import ValidationError
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional
+
+from django.db import connection
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.exceptions import NotAcceptable, ValidationError
 from rest_framework.fields import NullBooleanField
-from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from configfactory import constants
+from configfactory.api.authentication import api_tokens
+from configfactory.api.renderers import get_settings_renderer_classes
 from configfactory.api.serializers import EnvironmentSerializer
-from configfactory.models import Environment, User
-from configfactory.services import get_settings
+from configfactory.models import Component, Environment, User
+from configfactory.services import get_settings, iter_settings
+from configfactory.snapshots import settings_revisions, settings_snapshots
+from configfactory.utils import compress, iter_compress, json_iterdumps
 
 
 class EnvironmentsAPIView(APIView):
@@ -39,32 +52,573 @@ class EnvironmentSettingsAPIView(APIView):
 
     permission_classes = (IsAuthenticated,)
 
+    renderer_classes = get_settings_renderer_classes()
+
+    content_encodings = ('gzip', 'deflate')
+
+    streaming_formats = ('json',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (self.is_streaming()
+                and request.accepted_renderer.format
+                not in self.streaming_formats):
+            raise NotAcceptable(
+                'Streaming is supported for JSON responses only.'
+            )
+
     def get(self, request, alias):
 
-        user = request.user  # type: User
+        environment = self.get_environment(request, alias)
+        flatten = self.get_flatten(request)
+        components = self.get_components(request)
+        keys = self.get_keys(request)
+        since = self.get_since(request)
 
-        environment = get_object_or_404(
-            queryset=Environment.objects.with_user_perms(
-                user=user,
-                perms=(
-                    'view_environment',
-                ),
-            ).only('pk'),
-            alias=alias
+        # Answer clients having the latest revision
+        # without rendering settings at all
+        revision = settings_revisions.get(environment.pk)
+        etag = self.get_etag(
+            revision=revision,
+            flatten=flatten,
+            components=components,
+            keys=keys,
+            since=since
+        )
+
+        conditional = get_conditional_response(request, etag=etag)
+
+        if conditional is not None:
+            if conditional.status_code != status.HTTP_304_NOT_MODIFIED:
+                # Failed If-Match or If-Unmodified-Since precondition
+                return conditional
+            return self.not_modified_response(
+                revision=revision,
+                flatten=flatten,
+                components=components,
+                keys=keys,
+                since=since
+            )
+
+        if since is not None:
+            return self.delta_response(
+                environment=environment,
+                flatten=flatten,
+                since=since,
+                components=components,
+                keys=keys
+            )
+
+        return self.settings_response(
+            environment=environment,
+            flatten=flatten,
+            components=components,
+            keys=keys
+        )
+
+    def settings_response(self, environment, flatten, components, keys):
+
+        revision = settings_revisions.get(environment.pk)
+
+        snapshot = settings_snapshots.lookup(
+            environment_id=environment.pk,
+            flatten=flatten,
+            revision=revision
+        )
+
+        if self.is_streaming():
+            if snapshot is not None:
+                items = snapshot.filter(
+                    components=components,
+                    keys=keys
+                ).items()
+            else:
+                # Render component by component without snapshot
+                items = iter_settings(
+                    environment=environment,
+                    components=components,
+                    keys=keys,
+                    flatten=flatten
+                )
+            response = self.set_revision_headers(
+                response=self.streaming_response(json_iterdumps(items)),
+                revision=revision,
+                flatten=flatten,
+                components=components,
+                keys=keys
+            )
+            if snapshot is None:
+                # No snapshot is stored for delta requests
+                del response['X-Settings-Revision']
+            return response
+
+        if snapshot is not None:
+            data = snapshot.filter(components=components, keys=keys)
+        elif self.is_partial():
+            snapshot = settings_snapshots.lookup_scoped(
+                environment_id=environment.pk,
+                flatten=flatten,
+                revision=revision,
+                components=components,
+                keys=keys
+            )
+            if snapshot is None:
+                # Render selected components only instead of
+                # the whole environment snapshot
+                snapshot = settings_snapshots.store(
+                    environment_id=environment.pk,
+                    flatten=flatten,
+                    revision=revision,
+                    data=get_settings(
+                        environment=environment,
+                        components=components,
+                        keys=keys,
+                        flatten=flatten,
+                        inject=True
+                    ),
+                    components=components,
+                    keys=keys
+                )
+            data = snapshot.data
+        else:
+            snapshot = settings_snapshots.get(
+                environment=environment,
+                flatten=flatten
+            )
+            revision = snapshot.revision
+            data = snapshot.filter(components=components)
+
+        return self.set_revision_headers(
+            response=self.render_response(
+                data=data,
+                snapshot=snapshot,
+                scope=(
+                    tuple(components) if components is not None else None,
+                    tuple(keys) if keys is not None else None,
+                )
+            ),
+            revision=revision,
+            flatten=flatten,
+            components=components,
+            keys=keys
         )
 
-        data = get_settings(
+    def delta_response(self, environment, flatten, since, components, keys):
+
+        snapshot, delta = settings_snapshots.get_delta(
             environment=environment,
+            since=since,
+            components=components,
+            keys=keys
+        )
+
+        response = self.render_response(
+            data=delta,
+            # Full settings are answered for any unknown revision,
+            # cache bodies of stored revisions deltas only
+            snapshot=snapshot if not delta['full'] else None,
+            scope=(
+                'delta',
+                since,
+                tuple(components) if components is not None else None,
+                tuple(keys) if keys is not None else None,
+            )
+        )
+
+        return self.set_revision_headers(
+            response=response,
+            revision=snapshot.revision,
+            flatten=flatten,
+            components=components,
+            keys=keys,
+            since=since
+        )
+
+    def render_response(self, data, snapshot=None, scope=None):
+        """
+        Render and compress response body, once per snapshot
+        revision, scope, media type and content encoding.
+        """
+
+        renderer = self.request.accepted_renderer
+        media_type = self.request.accepted_media_type
+        encoding = self.get_content_encoding(self.request)
+
+        def render():
+            return compress(
+                renderer.render(
+                    data,
+                    accepted_media_type=media_type,
+                    renderer_context=self.get_renderer_context()
+                ),
+                encoding=encoding
+            )
+
+        if snapshot is None:
+            body = render()
+        else:
+            body = snapshot.get_body(
+                key=(scope, media_type, encoding),
+                render=render
+            )
+
+        response = HttpResponse(body, content_type=media_type)
+
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+        return response
+
+    def streaming_response(self, chunks):
+
+        encoding = self.get_content_encoding(self.request)
+
+        response = StreamingHttpResponse(
+            iter_compress(chunks, encoding=encoding),
+            content_type=self.request.accepted_renderer.media_type
+        )
+
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+        return response
+
+    def not_modified_response(self,
+                              revision,
+                              flatten,
+                              components,
+                              keys,
+                              since=None):
+        return self.set_revision_headers(
+            response=Response(status=status.HTTP_304_NOT_MODIFIED),
+            revision=revision,
+            flatten=flatten,
+            components=components,
+            keys=keys,
+            since=since
+        )
+
+    def set_revision_headers(self,
+                             response,
+                             revision,
+                             flatten,
+                             components,
+                             keys,
+                             since=None):
+        response['ETag'] = self.get_etag(
+            revision=revision,
+            flatten=flatten,
+            components=components,
+            keys=keys,
+            since=since
+        )
+        response['X-Settings-Revision'] = revision
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    def get_environment(self, request, alias: str) -> Environment:
+        environments = self.get_permitted_environments(request)
+        if alias not in environments:
+            raise Http404
+        return Environment(pk=environments[alias], alias=alias)
+
+    def get_permitted_environments(self, request) -> OrderedDict:
+        """Return aliases and ids of environments the user may view."""
+
+        environments = api_tokens.get_environments(request.auth)
+
+        if environments is None:
+            environments = OrderedDict(
+                Environment.objects.with_user_perms(
+                    user=request.user,
+                    perms=(
+                        'view_environment',
+                    ),
+                ).values_list('alias', 'pk')
+            )
+
+        return environments
+
+    def get_components(self, request) -> Optional[List[str]]:
+        """
+        Return aliases of requested components the user may view
+        or None for all components.
+        """
+
+        user = request.user  # type: User
+
+        components = self.get_requested_components(request)
+
+        if user.is_superuser:
+            return components
+
+        permitted = Component.objects.with_user_perms(
             user=user,
-            flatten=self.get_flatten(request),
-            inject=True
+            perms=(
+                'view_component',
+            )
         )
 
-        return Response(data)
+        if components is not None:
+            permitted = permitted.filter(alias__in=components)
+
+        return sorted(permitted.values_list('alias', flat=True))
+
+    def get_requested_components(self, request) -> Optional[List[str]]:
+
+        components = self.get_list_param(request, 'components')
+        keys = self.get_keys(request)
+
+        if keys is not None:
+            components = set(components or []) | {
+                key.split('.', 1)[0] for key in keys
+            }
+
+        if components is None:
+            return None
+
+        return sorted(components)
+
+    def get_since(self, request) -> Optional[int]:
+        try:
+            return int(request.query_params['since'])
+        except (KeyError, ValueError):
+            return None
+
+    def get_keys(self, request) -> Optional[List[str]]:
+        return self.get_list_param(request, 'keys')
+
+    def get_list_param(self, request, name) -> Optional[List[str]]:
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        return sorted({
+            item.strip() for item in value.split(',') if item.strip()
+        })
+
+    def is_partial(self) -> bool:
+        return any(
+            self.request.query_params.get(name)
+            for name in ('components', 'keys')
+        )
+
+    def get_content_encoding(self, request) -> Optional[str]:
+        """Return the most preferred supported content encoding."""
+
+        accepted = {}
+
+        for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            name, sep, params = item.partition(';')
+            quality = 1.0
+            params = params.replace(' ', '')
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+
+        encodings = [
+            encoding
+            for encoding in self.content_encodings
+            if accepted.get(encoding, accepted.get('*', 0)) > 0
+        ]
+
+        if not encodings:
+            return None
+
+        return max(
+            encodings,
+            key=lambda encoding: accepted.get(encoding, accepted.get('*'))
+        )
+
+    def is_streaming(self) -> bool:
+        return self.get_bool_param(self.request, 'stream')
+
+    def get_etag(self, revision, flatten, components, keys=None, since=None):
+        if components is None and keys is None and since is None:
+            scope = 'all'
+        else:
+            scope = hashlib.md5('{}|{}|{}'.format(
+                ','.join(components or []),
+                ','.join(keys or []),
+                since if since is not None else ''
+            ).encode()).hexdigest()[:16]
+        return quote_etag(
+            '{revision}-{flatten}-{scope}-{representation}'.format(
+                revision=revision,
+                flatten=int(flatten),
+                scope=scope,
+                representation=self.get_representation()
+            )
+        )
+
+    def get_representation(self) -> str:
+        """
+        Return negotiated representation name, so every format
+        and content encoding gets its own strong ETag.
+        """
+
+        parts = [self.request.accepted_renderer.format]
+
+        if self.is_streaming():
+            parts.append('stream')
+
+        parts.append(
+            self.get_content_encoding(self.request) or 'identity'
+        )
+
+        return '-'.join(parts)
 
     def get_flatten(self, request):
-        flatten = request.query_params.get('flatten')
+        return self.get_bool_param(request, 'flatten')
+
+    def get_bool_param(self, request, name) -> bool:
+        value = request.query_params.get(name)
         try:
-            return NullBooleanField().to_internal_value(flatten)
+            return bool(NullBooleanField().to_internal_value(value))
         except ValidationError:
             return False
+
+
+class EnvironmentSettingsWatchAPIView(EnvironmentSettingsAPIView):
+    """
+    Wait until environment settings revision is greater than
+    the `revision` query parameter, then return the new settings.
+
+    Served by the settings server worker, the request does not wait
+    in the view. It is answered right away and, when there are no
+    changes yet, handed over to the worker watchers by filling
+    the watch request environ item.
+    """
+
+    default_timeout = 30
+
+    max_timeout = 60
+
+    def is_streaming(self) -> bool:
+        # Watchers are answered from snapshots shared between them
+        return False
+
+    def get(self, request, alias):
+
+        environment = self.get_environment(request, alias)
+        flatten = self.get_flatten(request)
+        components = self.get_components(request)
+        keys = self.get_keys(request)
+        client_revision = self.get_revision(request)
+
+        # Do not keep database connection while waiting
+        connection.close()
+
+        timeout = self.get_timeout(request)
+
+        if constants.WATCH_ENVIRON_KEY in request.META:
+            revision = settings_revisions.get(environment.pk)
+            watch = request.META[constants.WATCH_ENVIRON_KEY]
+            if (watch is not None
+                    and timeout > 0
+                    and revision <= client_revision):
+                watch.update(
+                    environment_id=environment.pk,
+                    revision=client_revision,
+                    timeout=timeout
+                )
+        else:
+            revision = settings_revisions.wait(
+                environment_id=environment.pk,
+                revision=client_revision,
+                timeout=timeout
+            )
+
+        if revision <= client_revision:
+            return self.not_modified_response(
+                revision=revision,
+                flatten=flatten,
+                components=components,
+                keys=keys
+            )
+
+        return self.settings_response(
+            environment=environment,
+            flatten=flatten,
+            components=components,
+            keys=keys
+        )
+
+    def get_revision(self, request) -> int:
+        try:
+            return int(request.query_params.get('revision', 0))
+        except ValueError:
+            return 0
+
+    def get_timeout(self, request) -> float:
+        try:
+            timeout = float(
+                request.query_params.get('timeout', self.default_timeout)
+            )
+        except ValueError:
+            timeout = self.default_timeout
+        return min(max(timeout, 0), self.max_timeout)
+
+
+class BulkSettingsAPIView(EnvironmentSettingsAPIView):
+    """
+    Stream settings of all permitted environments, or of those given
+    by the `environments` query parameter, as one JSON object keyed
+    by environment alias.
+    """
+
+    def get(self, request, **kwargs):
+
+        environments = self.get_environments(request)
+        flatten = self.get_flatten(request)
+        components = self.get_components(request)
+        keys = self.get_keys(request)
+
+        response = self.streaming_response(
+            self.stream_settings(
+                environments=environments,
+                flatten=flatten,
+                components=components,
+                keys=keys
+            )
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def stream_settings(self, environments, flatten, components, keys):
+
+        # Missing snapshots injections are checked before the
+        # response starts, so their errors are not sent as
+        # a truncated body
+        snapshots = settings_snapshots.get_many(
+            environments=environments,
+            flatten=flatten
+        )
+
+        return json_iterdumps(
+            (
+                environment.alias,
+                snapshot.filter(components=components, keys=keys)
+            )
+            for environment, snapshot in snapshots
+        )
+
+    def is_streaming(self) -> bool:
+        return True
+
+    def get_environments(self, request):
+
+        environments = self.get_permitted_environments(request)
+
+        aliases = self.get_list_param(request, 'environments')
+
+        if aliases is not None:
+            aliases = set(aliases)
+
+        return [
+            Environment(pk=pk, alias=alias)
+            for alias, pk in environments.items()
+            if aliases is None or alias in aliases
+        ]
@@ -0,0 +1,240 @@
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.db import transaction
+
+from configfactory.api.authentication import api_tokens
+from configfactory.exceptions import DataImportError
+from configfactory.menus import sidebar_menus
+from configfactory.models import (
+    Component,
+    Config,
+    Environment,
+    InjectionReference,
+    JSONSchema,
+)
+from configfactory.shortcuts import user_perms
+from configfactory.snapshots import settings_revisions
+from configfactory.utils import get_inject_keys
+
+BATCH_SIZE = 1000
+
+
+def export_records() -> Iterator[dict]:
+    """
+    Yield environments, components, JSON schemas and configurations
+    as plain records, in the order they have to be imported.
+    """
+
+    environments = (
+        Environment.objects
+        .order_by('pk')
+        .values_list('alias', 'name', 'order')
+    )
+
+    for alias, name, order in environments.iterator():
+        yield {
+            'model': 'environment',
+            'alias': alias,
+            'name': name,
+            'order': order,
+        }
+
+    components = (
+        Component.objects
+        .order_by('pk')
+        .values_list('alias', 'name', 'is_global', 'use_schema')
+    )
+
+    for alias, name, is_global, use_schema in components.iterator():
+        yield {
+            'model': 'component',
+            'alias': alias,
+            'name': name,
+            'is_global': is_global,
+            'use_schema': use_schema,
+        }
+
+    json_schemas = (
+        JSONSchema.objects
+        .order_by('component_id')
+        .values_list('component__alias', 'content')
+    )
+
+    for component, content in json_schemas.iterator():
+        yield {
+            'model': 'json_schema',
+            'component': component,
+            'content': content,
+        }
+
+    configs = (
+        Config.objects
+        .order_by('component_id', 'environment_id')
+        .values_list('component__alias', 'environment__alias',
+                     'settings_content')
+    )
+
+    for component, environment, content in configs.iterator():
+        yield {
+            'model': 'config',
+            'component': component,
+            'environment': environment,
+            'content': content,
+        }
+
+
+def import_records(records: Iterable[dict], batch_size: int = BATCH_SIZE):
+    """
+    Import exported records into empty installation.
+
+    Records are inserted in batches without sending model signals,
+    so injection references, revisions and caches are rebuilt
+    once all of them are imported. The whole import runs in one
+    transaction, so a failed import leaves the installation empty.
+    """
+
+    if Environment.objects.exists() or Component.objects.exists():
+        raise DataImportError(
+            'Components and environments must not exist before import.'
+        )
+
+    importer = _RecordsImporter()
+
+    records = iter(records)
+
+    try:
+        with transaction.atomic():
+
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    importer.insert(batch)
+
+            index_all_config_references(batch_size)
+
+    finally:
+        settings_revisions.bump()
+        user_perms.invalidate()
+        api_tokens.invalidate()
+        sidebar_menus.invalidate()
+
+
+def index_all_config_references(batch_size: int = BATCH_SIZE):
+    """Rebuild injection references of all configurations."""
+
+    with transaction.atomic():
+
+        InjectionReference.objects.all().delete()
+
+        configs = Config.objects.with_base().order_by('pk').iterator()
+
+        while True:
+            batch = list(islice(configs, batch_size))
+            if not batch:
+                break
+            InjectionReference.objects.bulk_create([
+                InjectionReference(config_id=config.pk, key=key)
+                for config in batch
+                for key in get_inject_keys(config.settings_json)
+            ])
+
+
+class _RecordsImporter:
+
+    def __init__(self):
+        self._environment_ids = {}
+        self._component_ids = {}
+
+    def insert(self, records: list):
+
+        rows = {
+            'environment': [],
+            'component': [],
+            'json_schema': [],
+            'config': [],
+        }
+
+        for record in records:
+            try:
+                rows[record['model']].append(record)
+            except (KeyError, TypeError):
+                raise DataImportError(
+                    'Invalid record: {}'.format(record)
+                )
+
+        # Dependencies are inserted first within every batch
+        try:
+            self._insert_environments(rows['environment'])
+            self._insert_components(rows['component'])
+            self._insert_json_schemas(rows['json_schema'])
+            self._insert_configs(rows['config'])
+        except KeyError as exc:
+            raise DataImportError(
+                'Missing record field or reference: {}'.format(exc)
+            )
+
+    def _insert_environments(self, records: list):
+
+        if not records:
+            return
+
+        Environment.objects.bulk_create([
+            Environment(
+                alias=record['alias'],
+                name=record['name'],
+                order=record.get('order', 0)
+            )
+            for record in records
+        ])
+
+        self._environment_ids.update(
+            Environment.objects
+            .filter(alias__in=[record['alias'] for record in records])
+            .values_list('alias', 'pk')
+        )
+
+    def _insert_components(self, records: list):
+
+        if not records:
+            return
+
+        Component.objects.bulk_create([
+            Component(
+                alias=record['alias'],
+                name=record['name'],
+                is_global=record.get('is_global', False),
+                use_schema=record.get('use_schema', False)
+            )
+            for record in records
+        ])
+
+        self._component_ids.update(
+            Component.objects
+            .filter(alias__in=[record['alias'] for record in records])
+            .values_list('alias', 'pk')
+        )
+
+    def _insert_json_schemas(self, records: list):
+        JSONSchema.objects.bulk_create([
+            JSONSchema(
+                component_id=self._component_ids[record['component']],
+                content=record['content']
+            )
+            for record in records
+        ])
+
+    def _insert_configs(self, records: list):
+        Config.objects.bulk_create([
+            Config(
+                component_id=self._component_ids[record['component']],
+                environment_id=(
+                    self._environment_ids[record['environment']]
+                    if record['environment'] else None
+                ),
+                settings_content=record['content']
+            )
+            for record in records
+        ])
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from configfactory.exceptions import BundleError
+from configfactory.models import Environment
+from configfactory.services import get_settings
+from configfactory.snapshots import settings_revisions
+
+MAGIC = b'CFBUNDLE'
+
+FORMAT_VERSION = 2
+
+FLAG_FLATTEN = 0x1
+
+FLAG_SECURE = 0x2
+
+# Magic, format version, flags, settings revision, keys count
+# and SHA-256 checksum of the flags, keys count and everything
+# after the header
+HEADER = struct.Struct('>8sHHQI32s')
+
+REVISION_OFFSET = 12
+
+CHECKSUM_FIELDS = struct.Struct('>HI')
+
+# Key offset, key length, value offset and value length
+# relative to the end of the header
+INDEX_ENTRY = struct.Struct('>IIII')
+
+
+def dump_bundle(data: dict,
+                revision: int,
+                flatten: bool = False,
+                secure: bool = False) -> bytes:
+    """
+    Encode settings to bundle.
+
+    Keys are stored sorted by their UTF-8 bytes with fixed size index
+    entries, so a reader finds a value by binary search without
+    decoding anything else. Values are stored as JSON.
+    """
+
+    items = sorted(
+        (str(key).encode(), json.dumps(value).encode())
+        for key, value in data.items()
+    )
+
+    key_offset = INDEX_ENTRY.size * len(items)
+    value_offset = key_offset + sum(len(key) for key, _ in items)
+
+    index = []
+
+    for key, value in items:
+        index.append(INDEX_ENTRY.pack(
+            key_offset,
+            len(key),
+            value_offset,
+            len(value)
+        ))
+        key_offset += len(key)
+        value_offset += len(value)
+
+    payload = b''.join(
+        index
+        + [key for key, _ in items]
+        + [value for _, value in items]
+    )
+
+    flags = (FLAG_FLATTEN if flatten else 0) | (FLAG_SECURE if secure else 0)
+
+    return HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        flags,
+        revision,
+        len(items),
+        _checksum(flags, len(items), payload)
+    ) + payload
+
+
+class Bundle:
+    """Memory mapped settings bundle."""
+
+    def __init__(self, path: str, verify: bool = True):
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._read_header(verify)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def __getitem__(self, key: str):
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return self._read_value(entry)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        for i in range(self.count):
+            yield self._read_key(self._read_entry(i)).decode()
+
+    def to_dict(self) -> OrderedDict:
+        """Decode the whole bundle."""
+        return OrderedDict([
+            (self._read_key(entry).decode(), self._read_value(entry))
+            for entry in map(self._read_entry, range(self.count))
+        ])
+
+    def close(self):
+        self._mmap.close()
+
+    def _read_header(self, verify: bool):
+
+        if len(self._mmap) < HEADER.size:
+            raise BundleError('Bundle is truncated.')
+
+        (
+            magic,
+            version,
+            flags,
+            self.revision,
+            self.count,
+            self.checksum
+        ) = HEADER.unpack_from(self._mmap)
+
+        if magic != MAGIC:
+            raise BundleError('Not a settings bundle.')
+
+        if version != FORMAT_VERSION:
+            raise BundleError(
+                'Unsupported bundle format version: {}.'.format(version)
+            )
+
+        self.flatten = bool(flags & FLAG_FLATTEN)
+        self.secure = bool(flags & FLAG_SECURE)
+
+        if verify:
+            checksum = _checksum(flags, self.count, self._mmap[HEADER.size:])
+            if checksum != self.checksum:
+                raise BundleError('Bundle checksum mismatch.')
+
+        # Unverified bundles must not be read past their end either
+        if self.count * INDEX_ENTRY.size > len(self._mmap) - HEADER.size:
+            raise BundleError('Bundle keys count exceeds its size.')
+
+    def _find(self, key: str) -> Optional[tuple]:
+
+        key = key.encode()
+
+        lo, hi = 0, self.count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._read_entry(mid)
+            mid_key = self._read_key(entry)
+            if mid_key == key:
+                return entry
+            if mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return None
+
+    def _read_entry(self, i: int) -> tuple:
+        entry = INDEX_ENTRY.unpack_from(
+            self._mmap,
+            HEADER.size + i * INDEX_ENTRY.size
+        )
+        size = len(self._mmap) - HEADER.size
+        if entry[0] + entry[1] > size or entry[2] + entry[3] > size:
+            raise BundleError('Bundle index entry exceeds its size.')
+        return entry
+
+    def _read_key(self, entry: tuple) -> bytes:
+        offset = HEADER.size + entry[0]
+        return self._mmap[offset:offset + entry[1]]
+
+    def _read_value(self, entry: tuple):
+        offset = HEADER.size + entry[2]
+        return json.loads(
+            self._mmap[offset:offset + entry[3]].decode(),
+            object_pairs_hook=OrderedDict
+        )
+
+
+def _checksum(flags: int, count: int, payload: bytes) -> bytes:
+    checksum = hashlib.sha256(CHECKSUM_FIELDS.pack(flags, count))
+    checksum.update(payload)
+    return checksum.digest()
+
+
+def build_bundle(environment: Environment,
+                 path: str,
+                 flatten: bool = False,
+                 secure: bool = False) -> bool:
+    """
+    Write environment settings bundle unless the existing one is
+    up to date. Return whether the bundle file is replaced.
+
+    Settings are not rendered while the settings revision is the
+    bundle one, and the file is kept when rendered settings did
+    not change.
+    """
+
+    revision = settings_revisions.get(environment.pk)
+
+    checksum = None
+
+    try:
+        with Bundle(path) as bundle:
+            if (bundle.flatten, bundle.secure) == (flatten, secure):
+                if bundle.revision == revision:
+                    return False
+                checksum = bundle.checksum
+    except (OSError, ValueError, BundleError):
+        # Missing, empty or corrupted bundle is written again
+        pass
+
+    content = dump_bundle(
+        data=get_settings(
+            environment=environment,
+            flatten=flatten,
+            secure=secure,
+            inject=True
+        ),
+        revision=revision,
+        flatten=flatten,
+        secure=secure
+    )
+
+    if HEADER.unpack_from(content)[-1] == checksum:
+        # Refresh revision only, readers still see the same settings
+        with open(path, 'r+b') as f:
+            f.seek(REVISION_OFFSET)
+            f.write(struct.pack('>Q', revision))
+        return False
+
+    # Readers must never map partially written bundle
+    tmp_path = '{}.tmp'.format(path)
+
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+
+    os.replace(tmp_path, path)
+
+    return True
@@ -1,3 +1,6 @@
+import functools
+import json
+import multiprocessing
 import os
 import shutil
 
@@ -66,7 +69,20 @@ def cli(config):
     type=click.INT,
     default=1
 )
-def run(host, port, workers):
+@click.option(
+    '--worker-class', '-k',
+    help='The type of workers to use (default: sync). Sync workers '
+         'park settings watchers instead of waiting for changes.',
+    default='sync'
+)
+@click.option(
+    '--threads', '-t',
+    help='The number of worker threads for handling requests '
+         '(gthread worker class only).',
+    type=click.INT,
+    default=1
+)
+def run(host, port, workers, worker_class, threads):
     """Run ConfigFactory server."""
 
     from configfactory import settings
@@ -83,7 +99,9 @@ def run(host, port, workers):
                 host=host,
                 port=port
             ),
-            'workers': workers
+            'workers': workers,
+            'worker_class': worker_class,
+            'threads': threads,
         }
     )
     server.run()
@@ -105,6 +123,197 @@ def migrate():
     call_command('migrate')
 
 
+@cli.command()
+@click.argument(
+    'output',
+    type=click.File('w'),
+    default='-'
+)
+def export(output):
+    """
+    Export components, environments and settings as JSON lines.
+    """
+
+    from configfactory.backups import export_records
+
+    for record in export_records():
+        output.write(json.dumps(record))
+        output.write('\n')
+
+
+@cli.command(name='import')
+@click.argument(
+    'input',
+    type=click.File('r'),
+    default='-'
+)
+@click.option(
+    '--batch-size', '-b',
+    help='The number of records inserted in one transaction.',
+    type=click.INT,
+    default=1000
+)
+def import_(input, batch_size):
+    """
+    Import components, environments and settings from JSON lines.
+    """
+
+    from configfactory.backups import import_records
+    from configfactory.exceptions import DataImportError
+
+    records = (
+        json.loads(line)
+        for line in input
+        if line.strip()
+    )
+
+    try:
+        import_records(records, batch_size=batch_size)
+    except (DataImportError, ValueError) as exc:
+        raise click.ClickException(str(exc))
+
+
+@cli.command()
+@click.argument('environments', nargs=-1)
+@click.option(
+    '--output-dir', '-o',
+    help='Directory to write environment files to '
+         '(default: standard output).',
+    type=click.Path(file_okay=False, writable=True)
+)
+@click.option(
+    '--flatten',
+    help='Flatten settings keys.',
+    is_flag=True
+)
+@click.option(
+    '--secure',
+    help='Hide secured settings values.',
+    is_flag=True
+)
+@click.option(
+    '--indent',
+    help='JSON indentation (default: global indent setting).',
+    type=click.INT
+)
+@click.option(
+    '--format', '-f', 'format_',
+    help='Output format (default: json). Bundles are memory mappable '
+         'settings files updated only when settings change.',
+    type=click.Choice(['json', 'bundle']),
+    default='json'
+)
+@click.option(
+    '--processes', '-p',
+    help='The number of processes rendering environments in parallel '
+         '(default: number of CPUs).',
+    type=click.INT,
+    default=os.cpu_count() or 1
+)
+def render(environments, output_dir, flatten, secure, indent, format_,
+           processes):
+    """
+    Render settings of given (or all) environments.
+    """
+
+    from django.db import connections
+
+    from configfactory.models import Environment
+    from configfactory.utils import global_settings
+
+    if indent is None:
+        indent = global_settings['indent']
+
+    aliases = list(
+        Environment.objects
+        .filter(**({'alias__in': environments} if environments else {}))
+        .values_list('alias', flat=True)
+    )
+
+    missing = set(environments) - set(aliases)
+
+    if missing:
+        raise click.ClickException(
+            'Unknown environments: {}'.format(', '.join(sorted(missing)))
+        )
+
+    if output_dir is None and (len(aliases) > 1 or format_ == 'bundle'):
+        raise click.ClickException(
+            'Output directory is required to render many environments '
+            'or bundles.'
+        )
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    render_environment = functools.partial(
+        _render_environment,
+        output_dir=output_dir,
+        flatten=flatten,
+        secure=secure,
+        indent=indent,
+        format_=format_
+    )
+
+    if processes > 1 and len(aliases) > 1:
+
+        # Forked processes must not share database connections
+        connections.close_all()
+
+        with multiprocessing.Pool(min(processes, len(aliases))) as pool:
+            for path in pool.imap_unordered(render_environment, aliases):
+                if path:
+                    click.echo('Rendered {}'.format(path), err=True)
+
+    else:
+        for alias in aliases:
+            path = render_environment(alias)
+            if path:
+                click.echo('Rendered {}'.format(path), err=True)
+
+
+def _render_environment(alias, output_dir, flatten, secure, indent, format_):
+
+    from configfactory.bundles import build_bundle
+    from configfactory.models import Environment
+    from configfactory.services import get_settings
+    from configfactory.utils import json_dumps
+
+    environment = Environment.objects.get(alias=alias)
+
+    if format_ == 'bundle':
+        path = os.path.join(output_dir, '{}.cfb'.format(alias))
+        if build_bundle(
+            environment=environment,
+            path=path,
+            flatten=flatten,
+            secure=secure
+        ):
+            return path
+        return None
+
+    content = json_dumps(
+        get_settings(
+            environment=environment,
+            flatten=flatten,
+            secure=secure,
+            inject=True
+        ),
+        indent=indent
+    )
+
+    if output_dir is None:
+        click.echo(content)
+        return None
+
+    path = os.path.join(output_dir, '{}.json'.format(alias))
+
+    with open(path, 'w') as f:
+        f.write(content)
+
+    return path
+
+
 def main():
     cli(obj={})
 
@@ -1,3 +1,5 @@
 ACTION_CREATE = 'create'
 ACTION_UPDATE = 'update'
 ACTION_DELETE = 'delete'
+
+WATCH_ENVIRON_KEY = 'configfactory.watch'
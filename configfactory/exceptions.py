@@ -39,3 +39,11 @@ class ComponentDeleteError(Exception):
 
     def __str__(self):
         return self.message
+
+
+class DataImportError(Exception):
+    pass
+
+
+class BundleError(Exception):
+    pass
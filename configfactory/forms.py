@@ -6,7 +6,7 @@ from configfactory.models import Config, User
 from configfactory.services import (
     generate_api_token,
     get_api_token,
-    update_config,
+    validate_config,
 )
 from configfactory.utils import json_loads
 
@@ -25,15 +25,19 @@ class ConfigForm(forms.Form):
     def clean_settings_json(self):
         settings_json = self.cleaned_data['settings_json']
         try:
-            update_config(
+            validate_config(
                 config=self._config,
-                settings_json=settings_json,
-                commit=False
+                settings_json=settings_json
             )
         except ConfigUpdateError as e:
             raise ValidationError(str(e))
         return settings_json
 
+    def save(self) -> Config:
+        # Settings are already set and validated by `clean_settings_json`
+        self._config.save()
+        return self._config
+
 
 class JSONSchemaForm(forms.Form):
 
@@ -2,8 +2,11 @@ from collections import OrderedDict
 
 from django.contrib.auth.models import UserManager as BaseUserManager
 from django.db import models
+from django.db.models import OuterRef, Subquery
 from guardian.shortcuts import get_objects_for_user
 
+from configfactory.shortcuts import user_perms
+
 
 class UserQuerySet(models.QuerySet):
 
@@ -57,11 +60,7 @@ class UserManager(BaseUserManager):
 class EnvironmentQuerySet(models.QuerySet):
 
     def with_user_perms(self, user, perms):
-        return get_objects_for_user(
-            user=user,
-            perms=perms,
-            klass=self.model
-        )
+        return with_user_perms(self, user, perms)
 
 
 class EnvironmentManager(models.Manager):
@@ -88,11 +87,7 @@ class ComponentQuerySet(models.QuerySet):
         return self.filter(is_global=False)
 
     def with_user_perms(self, user, perms):
-        return get_objects_for_user(
-            user=user,
-            perms=perms,
-            klass=self.model
-        )
+        return with_user_perms(self, user, perms)
 
 
 class ComponentManager(models.Manager):
@@ -124,6 +119,17 @@ class ConfigQuerySet(models.QuerySet):
     def global_(self):
         return self.filter(component__is_global=True)
 
+    def with_base(self):
+        return self.annotate(
+            base_settings_content=Subquery(
+                self.model.objects
+                .base()
+                .filter(component=OuterRef('component'))
+                .order_by()
+                .values('settings_content')[:1]
+            )
+        )
+
     def settings(self):
         return OrderedDict([
             (config.component.alias, config.settings)
@@ -145,5 +151,32 @@ class ConfigManager(models.Manager):
     def global_(self):
         return self.get_queryset().global_()
 
+    def with_base(self):
+        return self.get_queryset().with_base()
+
     def settings(self):
         return self.get_queryset().settings()
+
+
+def with_user_perms(queryset, user, perms):
+    """Filter queryset by objects the user has all given permissions for."""
+
+    if not user.is_authenticated:
+        return get_objects_for_user(
+            user=user,
+            perms=perms,
+            klass=queryset
+        )
+
+    if user.is_superuser:
+        return queryset.all()
+
+    object_ids = user_perms.get(user).get_object_ids(
+        model_label=queryset.model._meta.label_lower,
+        perms=perms
+    )
+
+    if object_ids is None:
+        return queryset.all()
+
+    return queryset.filter(pk__in=object_ids)
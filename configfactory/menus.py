@@ -0,0 +1,107 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+
+from configfactory.models import Component, User, UserComponentStar
+
+
+class SidebarMenuHandler:
+    """Sidebar menu components handler.
+
+    Components the user may view are stored in the shared cache
+    under the global and the user menu versions, so component and
+    permission changes make all menus obsolete and star changes
+    only the menu of the user.
+    """
+
+    cache_prefix = 'sidebar_menu'
+
+    cache_timeout = 60 * 60 * 24
+
+    max_components = 25
+
+    def get(self, user: User) -> dict:
+
+        version_keys = [
+            self._make_key('version'),
+            self._make_key('version', user.pk),
+        ]
+
+        versions = cache.get_many(version_keys)
+
+        for key in version_keys:
+            if key not in versions:
+                versions[key] = self._bump_version(key)
+
+        cache_key = self._make_key(
+            user.pk,
+            *[versions[key] for key in version_keys]
+        )
+
+        menu = cache.get(cache_key)
+
+        if menu is None:
+            menu = self._build(user)
+            cache.set(cache_key, menu, timeout=self.cache_timeout)
+
+        return menu
+
+    def invalidate(self, user_id: int = None):
+
+        if user_id is None:
+            key = self._make_key('version')
+        else:
+            key = self._make_key('version', user_id)
+
+        # Bump once more after commit, so menus built from
+        # pre-commit data meanwhile are not served
+        self._bump_version(key)
+        transaction.on_commit(lambda: self._bump_version(key))
+
+    def _build(self, user: User) -> dict:
+
+        stars = set(
+            UserComponentStar.objects
+            .filter(user=user)
+            .values_list('component_id', flat=True)
+        )
+
+        components = list(
+            Component.objects.with_user_perms(
+                user=user,
+                perms=(
+                    'view_component',
+                )
+            ).values_list('pk', 'name')
+        )
+
+        # Starred components first, by name otherwise
+        components.sort(key=lambda component: component[0] not in stars)
+
+        return {
+            'components': [
+                {
+                    'pk': pk,
+                    'title': name,
+                    'url': reverse('component_base_settings', kwargs={
+                        'pk': pk
+                    }),
+                    'has_star': pk in stars
+                }
+                for pk, name in components[:self.max_components]
+            ],
+            'has_more': len(components) > self.max_components
+        }
+
+    def _bump_version(self, key) -> str:
+        version = uuid.uuid4().hex
+        cache.set(key, version, timeout=None)
+        return version
+
+    def _make_key(self, *parts):
+        return ':'.join([self.cache_prefix] + [str(part) for part in parts])
+
+
+sidebar_menus = SidebarMenuHandler()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_references(apps, schema_editor):
+    from configfactory.utils import (
+        get_inject_keys,
+        json_dumps,
+        json_loads,
+        merge_dict,
+    )
+
+    Config = apps.get_model('configfactory', 'Config')
+    InjectionReference = apps.get_model('configfactory', 'InjectionReference')
+
+    base_settings = {
+        config.component_id: json_loads(config.settings_content)
+        for config in Config.objects.filter(environment__isnull=True)
+    }
+
+    references = []
+
+    for config in Config.objects.all():
+        settings = json_loads(config.settings_content)
+        if config.environment_id:
+            settings = merge_dict(
+                base_settings.get(config.component_id, {}),
+                settings
+            )
+        references.extend([
+            InjectionReference(config_id=config.pk, key=key)
+            for key in get_inject_keys(json_dumps(settings))
+        ])
+
+    InjectionReference.objects.bulk_create(references, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configfactory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InjectionReference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=255, verbose_name='key')),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='references', to='configfactory.Config', verbose_name='config')),
+            ],
+            options={
+                'verbose_name': 'injection reference',
+                'verbose_name_plural': 'injection references',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='injectionreference',
+            unique_together=set([('config', 'key')]),
+        ),
+        migrations.RunPython(index_references, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from .component import Component
 from .config import Config
 from .environment import Environment
 from .global_settings import GlobalSettings
+from .injection_reference import InjectionReference
 from .json_schema import JSONSchema
 from .log_entry import LogEntry
 from .user import User
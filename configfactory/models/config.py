@@ -5,7 +5,7 @@ from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 
 from configfactory.managers import ConfigManager
-from configfactory.utils import json_dumps, json_loads, merge_dict
+from configfactory.utils import freeze, json_dumps, json_loads, merge_dict
 
 
 class Config(models.Model):
@@ -36,20 +36,34 @@ class Config(models.Model):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._base = None
+        self._settings_dict_cache = None
+        self._settings_cache = None
 
     @property
     def settings_dict(self) -> OrderedDict:
-        return json_loads(self.settings_content)
+        """Read-only parsed settings content."""
+        content = self.settings_content
+        cache = self._settings_dict_cache
+        if cache is None or cache[0] != content:
+            cache = (content, freeze(json_loads(content)))
+            self._settings_dict_cache = cache
+        return cache[1]
 
     @property
     def settings(self) -> OrderedDict:
+        """Read-only settings merged with base settings."""
         settings_dict = self.settings_dict
         if self.environment_id:
-            base_settings_dict = self.base.settings_dict
-            return merge_dict(
-                base_settings_dict,
-                settings_dict
-            )
+            base = self.base
+            key = (self.settings_content, base.settings_content)
+            cache = self._settings_cache
+            if cache is None or cache[0] != key:
+                cache = (key, freeze(merge_dict(
+                    base.settings_dict,
+                    settings_dict
+                )))
+                self._settings_cache = cache
+            return cache[1]
         return settings_dict
 
     @property
@@ -59,11 +73,20 @@ class Config(models.Model):
     @settings_json.setter
     def settings_json(self, value):
         self.settings_content = value
+        self._settings_dict_cache = None
+        self._settings_cache = None
 
     @property
     def base(self):
         if self.pk and self.environment_id and self._base is None:
-            self._base = self.component.configs.base().get()
+            if hasattr(self, 'base_settings_content'):
+                # Base settings content fetched with `with_base()`
+                self._base = Config(
+                    component_id=self.component_id,
+                    settings_content=self.base_settings_content
+                )
+            else:
+                self._base = self.component.configs.base().get()
         return self._base
 
     @base.setter
@@ -0,0 +1,26 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class InjectionReference(models.Model):
+
+    config = models.ForeignKey(
+        to='configfactory.Config',
+        on_delete=models.CASCADE,
+        related_name='references',
+        verbose_name=_('config')
+    )
+
+    key = models.CharField(
+        max_length=255,
+        db_index=True,
+        verbose_name=_('key')
+    )
+
+    class Meta:
+        verbose_name = _('injection reference')
+        verbose_name_plural = _('injection references')
+        unique_together = ('config', 'key')
+
+    def __str__(self):
+        return self.key
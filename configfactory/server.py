@@ -1,4 +1,12 @@
+import errno
+import threading
+import time
+
+from gunicorn import util
 from gunicorn.app.base import BaseApplication
+from gunicorn.workers.sync import SyncWorker
+
+from configfactory import constants
 
 
 class ServerApplication(BaseApplication):
@@ -19,8 +27,186 @@ class ServerApplication(BaseApplication):
                 if key in self.cfg.settings and value is not None
             ]
         )
+        # Sync workers serve settings watchers without waiting
+        if config.get('worker_class') == 'sync':
+            config['worker_class'] = 'configfactory.server.SettingsWorker'
         for key, value in config.items():
             self.cfg.set(key.lower(), value)
 
     def load(self):
         return self.wsgi_app
+
+
+class ParkRequest(Exception):
+    """Raised to hand over a watch request to worker watchers."""
+
+    def __init__(self, environment_id, revision, timeout):
+        super().__init__()
+        self.environment_id = environment_id
+        self.revision = revision
+        self.timeout = timeout
+
+
+class WatchApplication:
+    """WSGI application wrapper parking unchanged watch requests.
+
+    Requests get an empty watch environ item to be filled by the watch
+    view when there are no changes yet. Such requests are not answered
+    and `ParkRequest` is raised instead. Resumed requests get `None`,
+    so the view answers them right away.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def __call__(self, environ, start_response):
+
+        if getattr(self.local, 'resuming', False):
+            watch = environ[constants.WATCH_ENVIRON_KEY] = None
+        else:
+            watch = environ[constants.WATCH_ENVIRON_KEY] = {}
+
+        started = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            started[:] = [status, headers, exc_info]
+
+        response = self.app(environ, capture_start_response)
+
+        if watch and started[0].startswith('304'):
+            if hasattr(response, 'close'):
+                response.close()
+            raise ParkRequest(**watch)
+
+        start_response(*started)
+
+        return response
+
+
+class ParkedRequest:
+
+    def __init__(self, listener, req, client, addr, park: ParkRequest):
+        self.listener = listener
+        self.req = req
+        self.client = client
+        self.addr = addr
+        self.environment_id = park.environment_id
+        self.revision = park.revision
+        self.deadline = time.monotonic() + park.timeout
+
+
+class SettingsWatchers(threading.Thread):
+    """Parked watch requests handler.
+
+    One thread per worker process checks revisions of all parked
+    requests every `poll_interval` seconds and resumes those whose
+    environment revision changed or whose timeout expired.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, worker):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self._parked = []
+        self._lock = threading.Lock()
+
+    def park(self, request: ParkedRequest):
+        with self._lock:
+            self._parked.append(request)
+
+    def run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.check()
+
+    def check(self):
+
+        # Revisions handler needs configured Django
+        from configfactory.snapshots import settings_revisions
+
+        with self._lock:
+            parked, self._parked = self._parked, []
+
+        if not parked:
+            return
+
+        revisions = {}
+        for request in parked:
+            if request.environment_id not in revisions:
+                revisions[request.environment_id] = settings_revisions.get(
+                    request.environment_id
+                )
+
+        now = time.monotonic()
+        pending = []
+
+        for request in parked:
+            if (revisions[request.environment_id] > request.revision
+                    or request.deadline <= now):
+                self.worker.resume(request)
+            else:
+                pending.append(request)
+
+        with self._lock:
+            self._parked.extend(pending)
+
+
+class SettingsWorker(SyncWorker):
+    """Sync worker serving settings watchers without blocking.
+
+    Watch requests without changes yet are parked instead of waiting
+    in the worker, which keeps serving other requests meanwhile.
+    """
+
+    def init_process(self):
+        self.watchers = SettingsWatchers(worker=self)
+        self.watchers.start()
+        super().init_process()
+
+    def load_wsgi(self):
+        super().load_wsgi()
+        # Wrapped connections can not be kept open for later answer
+        if not self.cfg.is_ssl:
+            self.wsgi = WatchApplication(self.wsgi)
+
+    def handle(self, listener, client, addr):
+        self._listener = listener
+        super().handle(listener, client, addr)
+
+    def handle_error(self, req, client, addr, exc):
+        if isinstance(exc, ParkRequest):
+            # Keep connection open after the request handler closes it
+            self.watchers.park(ParkedRequest(
+                listener=self._listener,
+                req=req,
+                client=client.dup(),
+                addr=addr,
+                park=exc
+            ))
+            return
+        super().handle_error(req, client, addr, exc)
+
+    def resume(self, request: ParkedRequest):
+        """Answer parked request with current settings."""
+
+        self.wsgi.local.resuming = True
+
+        try:
+            self.handle_request(
+                request.listener,
+                request.req,
+                request.client,
+                request.addr
+            )
+        except StopIteration:
+            pass
+        except EnvironmentError as e:
+            if e.errno not in (errno.EPIPE, errno.ECONNRESET):
+                self.log.exception('Socket error resuming request.')
+        except Exception as e:
+            self.handle_error(request.req, request.client, request.addr, e)
+        finally:
+            self.wsgi.local.resuming = False
+            util.close(request.client)
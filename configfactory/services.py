@@ -1,14 +1,16 @@
 from collections import OrderedDict
-from typing import Union, Optional
+from typing import Iterable, Iterator, Optional, Tuple, Union
 
 import dictdiffer
 import jsonschema
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
-from django.db.models import Model
+from django.db.models import Model, Q
 from django.utils.translation import ugettext_lazy as _
+from guardian.models import GroupObjectPermission, UserObjectPermission
 
 from configfactory import constants
+from configfactory.api.authentication import api_tokens
 from configfactory.exceptions import (
     ComponentDeleteError,
     ConfigUpdateError,
@@ -18,19 +20,25 @@ from configfactory.models import (
     Component,
     Config,
     Environment,
+    InjectionReference,
     JSONSchema,
     LogEntry,
     User,
     UserComponentStar,
 )
+from configfactory.shortcuts import get_user_perm_q, user_perms
 from configfactory.utils import (
+    ParamsInjector,
+    SettingsInjector,
     cleanse_dict,
     flatten_dict,
+    get_inject_keys,
     global_settings,
-    inject_params,
+    inject_settings,
     json_dumps,
-    json_loads,
     model_to_dict,
+    schema_validators,
+    select_keys,
 )
 
 
@@ -38,21 +46,65 @@ def get_settings(
         config: Config = None,
         environment: Environment = None,
         user: User = None,
+        components: Iterable[str] = None,
+        keys: Iterable[str] = None,
         flatten: bool = False,
         secure: bool = False,
         inject: bool = False,
         raw: bool = False
 ) -> Union[str, OrderedDict]:
 
+    params = None
+
     if config:
         data = config.settings
         environment = config.environment
+        components = [config.component.alias]
     else:
         data = get_all_settings(
             environment=environment,
-            user=user
+            user=user,
+            components=components
+        )
+        # Whole environment settings are injection params as well
+        if user is None and components is None:
+            params = data
+
+    # Select settings keys
+    if keys is not None:
+        data = select_keys(data, set(keys))
+
+    # Load selected components injection dependencies only
+    if inject and params is None and components is not None:
+        params = get_all_settings(
+            environment=environment,
+            components=get_injection_dependencies(
+                environment=environment,
+                components=components
+            )
         )
 
+    return render_settings(
+        data=data,
+        environment=environment,
+        params=params,
+        flatten=flatten,
+        secure=secure,
+        inject=inject,
+        raw=raw
+    )
+
+
+def render_settings(
+        data: OrderedDict,
+        environment: Environment = None,
+        params: OrderedDict = None,
+        flatten: bool = False,
+        secure: bool = False,
+        inject: bool = False,
+        raw: bool = False
+) -> Union[str, OrderedDict]:
+
     # Secure settings values
     if secure:
         data = cleanse_dict(
@@ -65,27 +117,25 @@ def get_settings(
     if flatten:
         data = flatten_dict(data)
 
-    # Dump as json string
-    json_content = json_dumps(
-        obj=data,
-        indent=global_settings['indent']
-    )
-
     # Inject global settings values
     if inject:
-        params = get_all_settings(environment)
-        json_content = inject_params(
-            content=json_content,
+        if params is None:
+            params = get_all_settings(environment)
+        data = inject_settings(
+            data=data,
             params=flatten_dict(params),
             raise_exception=global_settings['inject_validation']
         )
 
     # Return as string
     if raw:
-        return json_content
+        return json_dumps(
+            obj=data,
+            indent=global_settings['indent']
+        )
 
     # Return as dict
-    return json_loads(json_content)
+    return data
 
 
 def get_config_settings(
@@ -107,87 +157,308 @@ def get_config_settings(
 
 
 def get_all_settings(environment: Environment = None,
-                     user: User = None) -> OrderedDict:
+                     user: User = None,
+                     components: Iterable[str] = None) -> OrderedDict:
+    return OrderedDict([
+        (config.component.alias, config.settings)
+        for config in get_settings_configs(
+            environment=environment,
+            user=user,
+            components=components
+        )
+    ])
+
+
+def get_settings_configs(environment: Environment = None,
+                         user: User = None,
+                         components: Iterable[str] = None):
 
-    component_ids = None
-    if user:
-        component_ids = list(
-            Component.objects.with_user_perms(
+    configs = Config.objects.select_related('component')
+
+    if components is not None:
+        configs = configs.filter(component__alias__in=components)
+
+    if environment:
+        configs = configs.filter(
+            Q(environment=environment)
+            | Q(environment__isnull=True, component__is_global=True)
+        ).with_base()
+    else:
+        configs = configs.base()
+
+    if user and not user.is_superuser:
+        configs = configs.filter(
+            get_user_perm_q(
                 user=user,
-                perms=(
-                    'view_component',
-                )
-            ).values_list(flat=True)
+                perm='view_component',
+                klass=Component,
+                field='component'
+            )
         )
 
-    configs = (
-        Config.objects
-        .select_related('component')
-        .filter(environment=environment)
+    return configs
+
+
+def iter_settings(environment: Environment = None,
+                  components: Iterable[str] = None,
+                  keys: Iterable[str] = None,
+                  flatten: bool = False) -> Iterator[Tuple[str, object]]:
+    """
+    Render settings one component at a time and return iterator
+    of their top level (or flattened) items.
+
+    Only components referred to by injections are kept in memory
+    as params, others are loaded and injected one by one. Injection
+    errors are raised by this call rather than in the middle of
+    iteration.
+    """
+
+    injector = get_settings_injector(environment)
+
+    if keys is not None:
+        keys = set(keys)
+
+    configs = get_settings_configs(
+        environment=environment,
+        components=components
+    )
+
+    return _iter_configs_settings(
+        configs=configs,
+        injector=injector,
+        keys=keys,
+        flatten=flatten
     )
 
-    if component_ids is not None:
-        configs = configs.filter(component_id__in=component_ids)
 
-    ret = OrderedDict()
-    base_configs = {}
+def get_settings_injector(environment: Environment = None
+                          ) -> SettingsInjector:
+    """
+    Return settings injector with params of components referred to
+    by injections. All referred keys are resolved at once, so
+    injection errors are raised before any settings are rendered.
+    """
+
+    references = InjectionReference.objects.all()
 
     if environment:
+        references = references.filter(
+            Q(config__environment=environment)
+            | Q(config__environment__isnull=True)
+        )
+    else:
+        references = references.filter(config__environment__isnull=True)
 
-        base_configs = (
-            Config.objects
-            .select_related('component')
-            .base()
+    referred_keys = set(references.values_list('key', flat=True).distinct())
+
+    referred = {
+        key.split('.', 1)[0]
+        for key in referred_keys
+    }
+
+    params = get_all_settings(
+        environment=environment,
+        components=get_injection_dependencies(
+            environment=environment,
+            components=referred
         )
-        if component_ids is not None:
-            base_configs = base_configs.filter(component_id__in=component_ids)
+    ) if referred else OrderedDict()
+
+    injector = SettingsInjector(
+        params=flatten_dict(params),
+        raise_exception=global_settings['inject_validation']
+    )
+
+    for key in sorted(referred_keys):
+        injector.resolve(key)
+
+    return injector
+
+
+def _iter_configs_settings(configs,
+                           injector: SettingsInjector,
+                           keys: Optional[set],
+                           flatten: bool) -> Iterator[Tuple[str, object]]:
+
+    for config in configs.iterator():
+
+        data = OrderedDict([
+            (config.component.alias, config.settings)
+        ])
+
+        if keys is not None:
+            data = select_keys(data, keys)
+
+        if flatten:
+            data = flatten_dict(data)
+
+        yield from injector.inject_settings(data).items()
+
+
+def get_injection_dependencies(environment: Optional[Environment],
+                               components: Iterable[str]) -> set:
+    """
+    Return aliases of given components and of all components
+    their settings refer to, directly or through other components.
+    """
+
+    aliases = set(components)
+    pending = set(aliases)
+
+    while pending:
+
+        references = InjectionReference.objects.filter(
+            config__component__alias__in=pending
+        )
+
+        if environment:
+            # Environment settings are merged with base ones
+            references = references.filter(
+                Q(config__environment=environment)
+                | Q(config__environment__isnull=True)
+            )
+        else:
+            references = references.filter(config__environment__isnull=True)
+
+        pending = {
+            key.split('.', 1)[0]
+            for key in references.values_list('key', flat=True).distinct()
+        } - aliases
+
+        aliases |= pending
+
+    return aliases
+
+
+def get_environments_settings(
+        environments: Iterable[Environment],
+        flatten: bool = False,
+        inject: bool = False
+) -> Iterator[Tuple[Environment, OrderedDict]]:
+    """
+    Render settings of many environments one at a time.
+
+    Base and global configs are fetched and parsed once and shared
+    between environments. Environment configs are fetched for one
+    environment at a time, so only its settings are kept in memory.
+    """
+
+    environments = list(environments)
+
+    if not environments:
+        return
+
+    bases = list(Config.objects.select_related('component').base())
 
-        configs |= base_configs.global_()
+    for environment in environments:
 
-        base_configs = {
+        configs = {
             config.component_id: config
-            for config in base_configs
+            for config in Config.objects.filter(environment=environment)
         }
 
-    for config in configs:
-        config.base = base_configs.get(config.component_id)
-        ret[config.component.alias] = config.settings
+        data = OrderedDict()
+
+        for base in bases:
+            component = base.component
+            if component.is_global:
+                data[component.alias] = base.settings
+            elif base.component_id in configs:
+                config = configs.pop(base.component_id)
+                config.base = base
+                data[component.alias] = config.settings
 
-    return ret
+        yield environment, render_settings(
+            data=data,
+            environment=environment,
+            params=data,
+            flatten=flatten,
+            inject=inject
+        )
 
 
 def delete_component(component: Component):
 
-    with transaction.atomic():
+    if global_settings['inject_validation']:
 
-        environments = [None]
+        reference = (
+            InjectionReference.objects
+            .filter(_component_keys_q(component))
+            .exclude(config__component=component)
+            .first()
+        )
 
-        if not component.is_global:
-            for environment in Environment.objects.all():
-                environments.append(environment)
+        if reference is not None:
+            raise ComponentDeleteError(
+                _('One of other components is referring '
+                  'to `%(key)s` key.') % {
+                    'key': reference.key
+                }
+            )
 
-        component.delete()
+    component.delete()
 
-        for environment in environments:
-            try:
-                get_settings(
-                    environment=environment,
-                    inject=True,
-                    raw=True
-                )
-            except InjectKeyError as e:
-                raise ComponentDeleteError(
-                    _('One of other components is referring '
-                      'to `%(key)s` key.') % {
-                        'key': e.key
-                    }
-                )
+
+def get_schema_validator(json_schema: JSONSchema):
+    try:
+        return schema_validators.get(
+            component_id=json_schema.component_id,
+            content=json_schema.content
+        )
+    except jsonschema.SchemaError as e:
+        raise ConfigUpdateError(
+            _('Invalid JSON schema: %(msg)s') % {
+                'msg': str(e)
+            }
+        )
+
+
+def validate_component_configs(
+        component: Component,
+        json_schema: JSONSchema = None
+) -> OrderedDict:
+    """Validate base and all environment configs of component
+    against its JSON schema and return errors of invalid ones."""
+
+    if json_schema is None:
+        json_schema, created = JSONSchema.objects.get_or_create(
+            component=component
+        )
+
+    validator = get_schema_validator(json_schema)
+
+    configs = component.configs.with_base().select_related('environment')
+
+    errors = OrderedDict()
+
+    for config in configs:
+        error = jsonschema.exceptions.best_match(
+            validator.iter_errors(config.settings)
+        )
+        if error is not None:
+            errors[config] = str(error)
+
+    return errors
 
 
 def update_config(config: Config,
                   settings_json: str,
                   commit: bool = True) -> Config:
 
+    validate_config(config, settings_json)
+
+    if commit:
+        config.save()
+
+    return config
+
+
+def validate_config(config: Config, settings_json: str) -> Config:
+    """
+    Set config settings and validate them without saving, so
+    validated config can be saved as is.
+    """
+
     # Set settings
     config.settings_json = settings_json
 
@@ -199,10 +470,7 @@ def update_config(config: Config,
         )
 
         try:
-            jsonschema.validate(
-                instance=config.settings,
-                schema=json_schema.schema
-            )
+            get_schema_validator(json_schema).validate(config.settings)
         except jsonschema.ValidationError as e:
             raise ConfigUpdateError(
                 _('Invalid settings schema: %(msg)s') % {
@@ -212,10 +480,8 @@ def update_config(config: Config,
 
     if not component.is_global and config.environment_id:
 
-        base_config = component.configs.base().get()
-
         diff = dictdiffer.diff(
-            base_config.settings,
+            config.base.settings,
             config.settings,
         )
 
@@ -231,47 +497,197 @@ def update_config(config: Config,
                     }
                 )
 
+    try:
+        validate_config_injections(config)
+    except InjectKeyError as e:
+        if e.key.startswith(component.alias):
+            message = (
+                _('One of other components is referring '
+                  'to `%(key)s` key.') % {
+                    'key': e.key
+                }
+            )
+        else:
+            message = e.message
+        raise ConfigUpdateError(message)
+    except Exception as e:
+        raise ConfigUpdateError(str(e))
+
+    return config
+
+
+def validate_config_injections(config: Config):
+    """
+    Validate config own injections and injections referring
+    to config component keys within config environment.
+    """
+
+    component = config.component
+    environment = config.environment
+
+    # Validate against unsaved config settings
+    params = get_all_settings(environment)
+    params[component.alias] = config.settings
+    params = flatten_dict(params)
+
+    # Config own injections are checked below as they may be unsaved
+    references = InjectionReference.objects.filter(
+        _component_keys_q(component)
+    ).exclude(config=config)
+
+    if environment:
+        references = references.filter(
+            Q(config__environment=environment)
+            | Q(config__environment__isnull=True,
+                config__component__is_global=True)
+        )
+    else:
+        references = references.filter(config__environment__isnull=True)
+
+    injector = ParamsInjector(
+        params=params,
+        raise_exception=global_settings['inject_validation']
+    )
+
+    injector.inject(config.settings_json)
+
+    for key in references.values_list('key', flat=True).distinct():
+        injector.resolve(key)
+
+
+def index_config_references(config: Config):
+    """Update injection keys referenced by config settings."""
+
+    keys = set(get_inject_keys(config.settings_json))
+
+    indexed_keys = set(
+        config.references.values_list('key', flat=True)
+    )
+
+    if keys == indexed_keys:
+        return
+
+    config.references.filter(key__in=indexed_keys - keys).delete()
+
+    InjectionReference.objects.bulk_create([
+        InjectionReference(config=config, key=key)
+        for key in keys - indexed_keys
+    ])
+
+
+def create_environment_configs(environment: Environment,
+                               source: Environment = None):
+    """
+    Create configurations of all non-global components for new
+    environment, as copies of base or of given source environment ones.
+    """
+
     with transaction.atomic():
 
-        sid = transaction.savepoint()
+        if source is None:
+            source_configs = Config.objects.base()
+        else:
+            source_configs = (
+                Config.objects
+                .filter(environment=source)
+                .with_base()
+            )
 
-        config.save()
+        source_configs = list(
+            source_configs.filter(component__is_global=False)
+        )
 
-        try:
-            get_settings(
-                environment=config.environment,
-                inject=True,
-                raw=True
+        Config.objects.bulk_create([
+            Config(
+                component_id=source_config.component_id,
+                environment=environment,
+                settings_content=source_config.settings_content
             )
-        except InjectKeyError as e:
-            if e.key.startswith(config.component.alias):
-                message = (
-                    _('One of other components is referring '
-                      'to `%(key)s` key.') % {
-                        'key': e.key
-                    }
-                )
-            else:
-                message = e.message
-            raise ConfigUpdateError(message)
-        except Exception as e:
-            raise ConfigUpdateError(str(e))
-
-        if commit:
-            transaction.savepoint_commit(sid)
-        else:
-            transaction.savepoint_rollback(sid)
+            for source_config in source_configs
+        ])
 
-    return config
+        # Bulk created configurations are not indexed by signals
+        config_ids = dict(
+            Config.objects
+            .filter(environment=environment)
+            .values_list('component_id', 'pk')
+        )
+
+        InjectionReference.objects.bulk_create([
+            InjectionReference(
+                config_id=config_ids[source_config.component_id],
+                key=key
+            )
+            for source_config in source_configs
+            for key in get_inject_keys(source_config.settings_json)
+        ])
+
+
+def create_component_configs(component: Component):
+    """Create base and environment configurations for new component."""
+
+    configs = [
+        Config(component=component)
+    ]
+
+    with transaction.atomic():
+
+        if not component.is_global:
+            configs.extend(
+                Config(component=component, environment_id=environment_id)
+                for environment_id
+                in Environment.objects.values_list('pk', flat=True)
+            )
+
+        # Empty settings do not refer to anything
+        Config.objects.bulk_create(configs)
+
+
+def _component_keys_q(component: Component) -> Q:
+    return (
+        Q(key=component.alias)
+        | Q(key__startswith='{}.'.format(component.alias))
+    )
 
 
 def duplicate_environment(environment: Environment,
                           name: str,
-                          alias: str):
-    new_environment = Environment()
-    new_environment.name = name
-    new_environment.alias = alias
-    new_environment.save()
+                          alias: str) -> Environment:
+    """
+    Create environment with copies of given environment
+    configurations and object permissions.
+    """
+
+    new_environment = Environment(
+        name=name,
+        alias=alias,
+        order=environment.order
+    )
+
+    # Configurations are copied instead of seeded from base ones
+    new_environment.duplicate_of = environment
+
+    with transaction.atomic():
+
+        new_environment.save()
+
+        content_type = ContentType.objects.get_for_model(Environment)
+
+        for model in (UserObjectPermission, GroupObjectPermission):
+            perms = list(model.objects.filter(
+                content_type=content_type,
+                object_pk=str(environment.pk)
+            ))
+            for perm in perms:
+                perm.pk = None
+                perm.object_pk = str(new_environment.pk)
+            model.objects.bulk_create(perms)
+
+    # Bulk created permissions are not seen by signals
+    user_perms.invalidate()
+    api_tokens.invalidate()
+
+    return new_environment
 
 
 def generate_api_token() -> str:
@@ -1,6 +1,17 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Exists, IntegerField, Q
+from django.db.models.functions import Cast
 from guardian.core import ObjectPermissionChecker
+from guardian.models import GroupObjectPermission, UserObjectPermission
 from guardian.shortcuts import assign_perm
 
+from configfactory.utils import SharedVersionMixin
+
 
 def assign_default_perms(user, obj):
     model_name = obj._meta.model_name
@@ -26,3 +37,170 @@ def get_all_permissions(user, object_list):
         obj.pk: checker.get_perms(obj)
         for obj in object_list
     }
+
+
+def get_user_perm_q(user, perm, klass, field='pk') -> Q:
+    """
+    Return lookup of `klass` objects the user has permission for,
+    globally or per object, to be filtered within a single query.
+    """
+
+    content_type = ContentType.objects.get_for_model(klass)
+
+    perm_filter = {
+        'permission__codename': perm,
+        'permission__content_type': content_type,
+    }
+
+    user_object_ids = UserObjectPermission.objects.filter(
+        user=user,
+        **perm_filter
+    ).values_list(Cast('object_pk', IntegerField()))
+
+    group_object_ids = GroupObjectPermission.objects.filter(
+        group__user=user,
+        **perm_filter
+    ).values_list(Cast('object_pk', IntegerField()))
+
+    global_perm_object_ids = klass.objects.annotate(
+        has_global_perm=Exists(
+            Permission.objects.filter(
+                Q(user=user) | Q(group__user=user),
+                codename=perm,
+                content_type=content_type,
+            )
+        )
+    ).filter(has_global_perm=True).values('pk')
+
+    lookup = '{}__in'.format(field)
+
+    return (
+        Q(**{lookup: user_object_ids})
+        | Q(**{lookup: group_object_ids})
+        | Q(**{lookup: global_perm_object_ids})
+    )
+
+
+class UserPerms:
+    """User permissions snapshot."""
+
+    def __init__(self, global_perms: set, object_perms: dict):
+        # Set of (model label, codename) pairs
+        self.global_perms = global_perms
+        # Object ids keyed by (model label, codename) pairs
+        self.object_perms = object_perms
+
+    def get_object_ids(self,
+                       model_label: str,
+                       perms: Iterable[str]) -> Optional[set]:
+        """
+        Return ids of objects the user has all given permissions for
+        or None if the user has all of them globally.
+        """
+
+        codenames = {perm.split('.')[-1] for perm in perms}
+
+        codenames = [
+            codename
+            for codename in codenames
+            if (model_label, codename) not in self.global_perms
+        ]
+
+        if not codenames:
+            return None
+
+        return set.intersection(*[
+            self.object_perms.get((model_label, codename), set())
+            for codename in codenames
+        ])
+
+
+class UserPermsHandler(SharedVersionMixin):
+    """Users permissions snapshots handler.
+
+    Snapshots are stored in process memory and in the shared cache
+    under the current permissions version, which is bumped on any
+    permission change.
+    """
+
+    cache_prefix = 'user_perms'
+
+    cache_timeout = 60 * 60 * 24
+
+    def __init__(self):
+        self._perms = {}
+
+    def get(self, user) -> UserPerms:
+
+        self._sync()
+
+        perms = self._perms.get(user.pk)
+
+        if perms is None:
+            cache_key = self._make_key(self._version, user.pk)
+            perms = cache.get(cache_key)
+            if perms is None:
+                perms = self._build(user)
+                cache.set(cache_key, perms, timeout=self.cache_timeout)
+            self._perms[user.pk] = perms
+
+        return perms
+
+    def invalidate(self):
+        self._bump_version()
+        self._perms = {}
+
+    def _build(self, user) -> UserPerms:
+
+        global_perms = set()
+
+        if user.is_active:
+            global_perms = {
+                (self._make_label(app_label, model_name), codename)
+                for app_label, model_name, codename in (
+                    Permission.objects.filter(
+                        Q(user=user) | Q(group__user=user)
+                    ).order_by().values_list(
+                        'content_type__app_label',
+                        'content_type__model',
+                        'codename'
+                    )
+                )
+            }
+
+        object_perms = defaultdict(set)
+
+        for object_perms_queryset in (
+                UserObjectPermission.objects.filter(user=user),
+                GroupObjectPermission.objects.filter(group__user=user),
+        ):
+            for app_label, model_name, codename, object_pk in (
+                    object_perms_queryset.values_list(
+                        'content_type__app_label',
+                        'content_type__model',
+                        'permission__codename',
+                        'object_pk'
+                    )
+            ):
+                object_perms[(
+                    self._make_label(app_label, model_name),
+                    codename
+                )].add(int(object_pk))
+
+        return UserPerms(
+            global_perms=global_perms,
+            object_perms=dict(object_perms)
+        )
+
+    def _sync(self):
+        if self._check_version():
+            self._perms = {}
+
+    def _make_label(self, app_label, model_name):
+        return '{}.{}'.format(app_label, model_name)
+
+    def _make_key(self, *parts):
+        return ':'.join([self.cache_prefix] + [str(part) for part in parts])
+
+
+user_perms = UserPermsHandler()
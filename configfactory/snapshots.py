@@ -0,0 +1,438 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from configfactory.models import Environment
+from configfactory.services import (
+    get_environments_settings,
+    get_settings,
+    get_settings_injector,
+)
+from configfactory.utils import (
+    diff_flat_dict,
+    flatten_dict,
+    global_settings,
+    select_keys,
+)
+
+
+class SettingsRevisionHandler:
+    """Environment settings revisions handler.
+
+    Every change that may affect rendered settings takes a new value
+    from a shared monotonic clock and stores it under the environment
+    key (or the global key when all environments are affected). The
+    environment revision is the greatest of both values.
+    """
+
+    cache_prefix = 'settings_revision'
+
+    poll_interval = 0.5
+
+    def get(self, environment_id: Optional[int]) -> int:
+        keys = [
+            self._make_key(None),
+            self._make_key(environment_id),
+        ]
+        revisions = cache.get_many(keys)
+        for key in keys:
+            if key not in revisions:
+                # Lost or never set revision must not match
+                # anything clients have already seen.
+                revisions[key] = self._set(key)
+        return max(revisions.values())
+
+    def wait(self,
+             environment_id: int,
+             revision: int,
+             timeout: float) -> int:
+        """Wait until environment revision is greater than given one."""
+
+        deadline = time.monotonic() + timeout
+
+        while True:
+            current = self.get(environment_id)
+            if current > revision or time.monotonic() >= deadline:
+                return current
+            time.sleep(self.poll_interval)
+
+    def bump(self, environment_id: Optional[int] = None):
+        key = self._make_key(environment_id)
+        # Bump immediately for readers inside the transaction and once
+        # more after commit, so a snapshot rendered from pre-commit
+        # data is never served under the final revision.
+        self._set(key)
+        transaction.on_commit(lambda: self._set(key))
+
+    def delete(self, environment_id: int):
+        cache.delete(self._make_key(environment_id))
+
+    def _set(self, key) -> int:
+        revision = self._next()
+        cache.set(key, revision, timeout=None)
+        return revision
+
+    def _next(self) -> int:
+        clock_key = self._make_key('clock')
+        revision = max(
+            int(time.time() * 1000),
+            cache.get(clock_key, 0) + 1
+        )
+        cache.set(clock_key, revision, timeout=None)
+        return revision
+
+    def _make_key(self, environment_id):
+        return '{}:{}'.format(
+            self.cache_prefix,
+            'global' if environment_id is None else environment_id
+        )
+
+
+class Snapshot:
+    """Rendered environment settings."""
+
+    def __init__(self, revision: int, flatten: bool, data: OrderedDict):
+        self.revision = revision
+        self.flatten = flatten
+        self.data = data
+        self._bodies = {}
+
+    def __getstate__(self):
+        # Rendered bodies are kept in process memory only
+        state = self.__dict__.copy()
+        state['_bodies'] = {}
+        return state
+
+    def get_body(self, key: tuple, render: Callable[[], bytes]) -> bytes:
+        """Return response body rendered once per key."""
+
+        body = self._bodies.get(key)
+
+        if body is None:
+            body = self._bodies[key] = render()
+
+        return body
+
+    def filter(self,
+               components: Iterable[str] = None,
+               keys: Iterable[str] = None) -> OrderedDict:
+        """Return settings of given components or key paths only."""
+
+        data = self.data
+
+        if components is not None:
+            components = set(components)
+            data = OrderedDict([
+                (key, value)
+                for key, value in data.items()
+                if self._get_alias(key) in components
+            ])
+
+        if keys is not None:
+            keys = set(keys)
+            if self.flatten:
+                data = OrderedDict([
+                    (key, value)
+                    for key, value in data.items()
+                    if self._match_keys(key, keys)
+                ])
+            else:
+                data = select_keys(data, keys)
+
+        return data
+
+    def _get_alias(self, key: str) -> str:
+        if self.flatten:
+            return key.split('.', 1)[0]
+        return key
+
+    def _match_keys(self, key: str, keys: set) -> bool:
+        return key in keys or any(
+            key.startswith(prefix + '.') for prefix in keys
+        )
+
+
+class SettingsSnapshotHandler:
+    """Rendered settings snapshots handler.
+
+    Snapshots are rendered with injections for the whole environment
+    and stored both in process memory and in the shared cache under
+    the current environment revision, so any revision bump makes
+    them obsolete.
+    """
+
+    cache_prefix = 'settings_snapshot'
+
+    cache_timeout = 60 * 60
+
+    def __init__(self):
+        self._snapshots = {}
+
+    def get(self, environment: Environment, flatten: bool = False) -> Snapshot:
+
+        revision = settings_revisions.get(environment.pk)
+
+        snapshot = self.lookup(environment.pk, flatten, revision)
+
+        if snapshot is None:
+            snapshot = self._store(
+                environment_id=environment.pk,
+                flatten=flatten,
+                revision=revision,
+                data=get_settings(
+                    environment=environment,
+                    flatten=flatten,
+                    inject=True
+                )
+            )
+
+        return snapshot
+
+    def get_many(self,
+                 environments: Iterable[Environment],
+                 flatten: bool = False
+                 ) -> Iterator[Tuple[Environment, Snapshot]]:
+        """
+        Return iterator of snapshots of many environments rendering
+        missing ones together, one environment at a time.
+
+        Injections of missing snapshots are checked by this call,
+        so their errors are not raised in the middle of iteration.
+        """
+
+        environments = list(environments)
+
+        revisions = OrderedDict()
+        snapshots = {}
+
+        for environment in environments:
+            revision = settings_revisions.get(environment.pk)
+            revisions[environment.pk] = revision
+            snapshots[environment.pk] = self.lookup(
+                environment.pk, flatten, revision
+            )
+
+        missing = [
+            environment
+            for environment in environments
+            if snapshots[environment.pk] is None
+        ]
+
+        if global_settings['inject_validation']:
+            for environment in missing:
+                get_settings_injector(environment)
+
+        return self._iter_many(
+            environments=environments,
+            flatten=flatten,
+            revisions=revisions,
+            snapshots=snapshots,
+            rendered=get_environments_settings(
+                environments=missing,
+                flatten=flatten,
+                inject=True
+            )
+        )
+
+    def _iter_many(self,
+                   environments,
+                   flatten,
+                   revisions,
+                   snapshots,
+                   rendered) -> Iterator[Tuple[Environment, Snapshot]]:
+
+        for environment in environments:
+            snapshot = snapshots.pop(environment.pk)
+            if snapshot is None:
+                # Missing snapshots are rendered in the same order
+                _, data = next(rendered)
+                snapshot = self._store(
+                    environment_id=environment.pk,
+                    flatten=flatten,
+                    revision=revisions[environment.pk],
+                    data=data
+                )
+            yield environment, snapshot
+
+    def get_delta(self,
+                  environment: Environment,
+                  since: int,
+                  components: Iterable[str] = None,
+                  keys: Iterable[str] = None
+                  ) -> Tuple[Snapshot, OrderedDict]:
+        """
+        Return current snapshot and flattened settings changes made
+        after given revision, or the whole flattened settings if the
+        snapshot of given revision is not stored anymore.
+        """
+
+        # Compare with snapshot of any format client has seen,
+        # either whole or of the same components and keys
+        for flatten in (True, False):
+            base = (
+                self._load(environment.pk, flatten, since)
+                or self.lookup_scoped(
+                    environment.pk, flatten, since, components, keys
+                )
+            )
+            if base is not None:
+                break
+
+        snapshot = self.get(
+            environment=environment,
+            flatten=base.flatten if base is not None else True
+        )
+
+        new = snapshot.filter(components=components, keys=keys)
+
+        if not snapshot.flatten:
+            new = flatten_dict(new)
+
+        if base is None:
+            return snapshot, OrderedDict([
+                ('revision', snapshot.revision),
+                ('since', since),
+                ('full', True),
+                ('changed', new),
+                ('removed', []),
+            ])
+
+        old = base.filter(components=components, keys=keys)
+
+        if not base.flatten:
+            old = flatten_dict(old)
+
+        changed, removed = diff_flat_dict(old, new)
+
+        return snapshot, OrderedDict([
+            ('revision', snapshot.revision),
+            ('since', since),
+            ('full', False),
+            ('changed', changed),
+            ('removed', removed),
+        ])
+
+    def store(self,
+              environment_id: int,
+              flatten: bool,
+              revision: int,
+              data: OrderedDict,
+              components: Iterable[str] = None,
+              keys: Iterable[str] = None) -> Snapshot:
+        """
+        Store settings rendered outside of the handler. Settings of
+        selected components or keys are kept in the shared cache only,
+        to be served by `lookup_scoped` and compared with by
+        `get_delta`.
+        """
+
+        if components is None and keys is None:
+            return self._store(environment_id, flatten, revision, data)
+
+        snapshot = Snapshot(
+            revision=revision,
+            flatten=flatten,
+            data=data
+        )
+
+        cache.set(
+            self._make_scoped_key(
+                environment_id, flatten, revision, components, keys
+            ),
+            snapshot,
+            timeout=self.cache_timeout
+        )
+
+        return snapshot
+
+    def lookup(self, environment_id, flatten, revision) -> Optional[Snapshot]:
+        """Return existing snapshot of given revision without rendering."""
+
+        snapshot = self._load(environment_id, flatten, revision)
+
+        if snapshot is not None:
+            self._snapshots[(environment_id, flatten)] = snapshot
+
+        return snapshot
+
+    def lookup_scoped(self,
+                      environment_id: int,
+                      flatten: bool,
+                      revision: int,
+                      components: Iterable[str] = None,
+                      keys: Iterable[str] = None) -> Optional[Snapshot]:
+        """Return stored settings of given components or keys."""
+
+        if components is None and keys is None:
+            return None
+
+        return cache.get(
+            self._make_scoped_key(
+                environment_id, flatten, revision, components, keys
+            )
+        )
+
+    def _load(self, environment_id, flatten, revision) -> Optional[Snapshot]:
+
+        snapshot = self._snapshots.get((environment_id, flatten))
+
+        if snapshot is None or snapshot.revision != revision:
+            snapshot = cache.get(
+                self._make_key(environment_id, flatten, revision)
+            )
+
+        return snapshot
+
+    def _store(self, environment_id, flatten, revision, data) -> Snapshot:
+
+        snapshot = Snapshot(
+            revision=revision,
+            flatten=flatten,
+            data=data
+        )
+
+        cache.set(
+            self._make_key(environment_id, flatten, revision),
+            snapshot,
+            timeout=self.cache_timeout
+        )
+
+        self._snapshots[(environment_id, flatten)] = snapshot
+
+        return snapshot
+
+    def discard(self, environment_id: int):
+        for flatten in (False, True):
+            self._snapshots.pop((environment_id, flatten), None)
+
+    def _make_key(self, environment_id, flatten, revision):
+        return '{}:{}:{}:{}'.format(
+            self.cache_prefix,
+            environment_id,
+            int(flatten),
+            revision
+        )
+
+    def _make_scoped_key(self,
+                         environment_id,
+                         flatten,
+                         revision,
+                         components,
+                         keys):
+        scope = hashlib.md5('{}|{}'.format(
+            ','.join(sorted(components or [])),
+            ','.join(sorted(keys or []))
+        ).encode()).hexdigest()
+        return '{}:{}'.format(
+            self._make_key(environment_id, flatten, revision),
+            scope
+        )
+
+
+settings_revisions = SettingsRevisionHandler()
+
+settings_snapshots = SettingsSnapshotHandler()
@@ -1,7 +1,16 @@
-from django.db.models.signals import post_save, pre_save
+from django.contrib.auth.models import Group
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
 from django.dispatch import receiver
 from django.forms import model_to_dict
+from guardian.models import GroupObjectPermission, UserObjectPermission
 
+from configfactory.api.authentication import api_tokens
+from configfactory.menus import sidebar_menus
 from configfactory.models import (
     Component,
     Config,
@@ -9,25 +18,27 @@ from configfactory.models import (
     GlobalSettings,
     JSONSchema,
     User,
+    UserComponentStar,
+)
+from configfactory.services import (
+    create_component_configs,
+    create_environment_configs,
+    generate_api_token,
+    index_config_references,
 )
-from configfactory.services import generate_api_token
-from configfactory.utils import global_settings
+from configfactory.shortcuts import user_perms
+from configfactory.snapshots import settings_revisions, settings_snapshots
+from configfactory.utils import global_settings, schema_validators
 
 
 @receiver(post_save, sender=Environment)
 def add_component_environments(instance, created, **kwargs):
 
     if created:
-
-        # Create environment configurations
-        for component in Component.objects.not_global():
-            base_config = component.configs.base().get()
-            env_config = Config(
-                component=component,
-                environment=instance,
-                settings_content=base_config.settings_content
-            )
-            component.configs.add(env_config, bulk=False)
+        create_environment_configs(
+            environment=instance,
+            source=getattr(instance, 'duplicate_of', None)
+        )
 
 
 @receiver(post_save, sender=Component)
@@ -35,14 +46,8 @@ def set_component_environments(instance, created, **kwargs):
 
     if created:
 
-        # Create environment configurations
-        configs = [
-            Config()
-        ]
-        if not instance.is_global:
-            for environment in Environment.objects.all():
-                configs.append(Config(environment=environment))
-        instance.configs.set(configs, bulk=False)
+        # Create base and environment configurations
+        create_component_configs(instance)
 
         # Create JSON schema
         if instance.use_schema:
@@ -51,12 +56,106 @@ def set_component_environments(instance, created, **kwargs):
 
 @receiver(post_save, sender=GlobalSettings)
 def reload_global_settings(instance, **kwargs):
-    fields = model_to_dict(instance, exclude=['id'])
-    for key, value in fields.items():
-        global_settings[key] = value
+    global_settings.update(model_to_dict(instance, exclude=['id']))
+
+
+@receiver(post_save, sender=Config)
+def index_config(instance: Config, **kwargs):
+
+    index_config_references(instance)
+
+    # Environment configurations are merged with base one
+    if instance.environment_id is None:
+        env_configs = (
+            instance.component.configs
+            .filter(environment__isnull=False)
+        )
+        for env_config in env_configs:
+            env_config.base = instance
+            index_config_references(env_config)
+
+
+@receiver(post_save, sender=Config)
+@receiver(post_delete, sender=Config)
+def bump_config_revision(instance: Config, **kwargs):
+    # Base configurations are merged into every environment
+    settings_revisions.bump(instance.environment_id)
+
+
+@receiver(post_save, sender=Component)
+@receiver(post_delete, sender=Component)
+@receiver(post_save, sender=GlobalSettings)
+def bump_global_revision(**kwargs):
+    settings_revisions.bump()
+
+
+@receiver(post_save, sender=Environment)
+def bump_environment_revision(instance: Environment, **kwargs):
+    settings_revisions.bump(instance.pk)
+
+
+@receiver(post_delete, sender=Environment)
+def delete_environment_revision(instance: Environment, **kwargs):
+    settings_revisions.delete(instance.pk)
+    settings_snapshots.discard(instance.pk)
 
 
 @receiver(pre_save, sender=User)
 def set_user_api_token(instance: User, **kwargs):
     if instance.is_apiuser and not instance.api_token:
         instance.api_token = generate_api_token()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_permissions(update_fields=None, **kwargs):
+    # Login updates last login time only
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    user_perms.invalidate()
+    api_tokens.invalidate()
+    sidebar_menus.invalidate()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_global_permissions(action, **kwargs):
+    if action.startswith('post_'):
+        user_perms.invalidate()
+        api_tokens.invalidate()
+        sidebar_menus.invalidate()
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+def invalidate_object_permissions(**kwargs):
+    user_perms.invalidate()
+    api_tokens.invalidate()
+    sidebar_menus.invalidate()
+
+
+@receiver(post_save, sender=Environment)
+@receiver(post_delete, sender=Environment)
+def invalidate_api_tokens(**kwargs):
+    api_tokens.invalidate()
+
+
+@receiver(post_save, sender=Component)
+@receiver(post_delete, sender=Component)
+def invalidate_sidebar_menus(**kwargs):
+    sidebar_menus.invalidate()
+
+
+@receiver(post_save, sender=UserComponentStar)
+@receiver(post_delete, sender=UserComponentStar)
+def invalidate_user_sidebar_menu(instance: UserComponentStar, **kwargs):
+    sidebar_menus.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=JSONSchema)
+@receiver(post_delete, sender=JSONSchema)
+def discard_schema_validator(instance: JSONSchema, **kwargs):
+    schema_validators.discard(instance.component_id)
@@ -1,10 +1,9 @@
-from django.db.models import Count
 from django.template import Library
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
-from guardian.shortcuts import get_objects_for_user
 
-from configfactory.models import Component, Environment, UserComponentStar, User
+from configfactory.menus import sidebar_menus
+from configfactory.models import Component, Environment, User
 
 register = Library()
 
@@ -18,43 +17,24 @@ def sidebar_menu(request):
     url_name = resolver_match.url_name
     pk = resolver_match.kwargs.get('pk')
 
-    components = get_objects_for_user(
-        user=user,
-        perms=(
-            'view_component',
-        ),
-        klass=Component
-    ).annotate(
-        has_star=Count('usercomponentstar')
-    ).order_by('-has_star', 'name')
-
-    components_stars = list(
-        UserComponentStar.objects.filter(
-            user=request.user,
-            component__in=components
-        ).values_list('component_id', flat=True)
-    )
+    menu = sidebar_menus.get(user)
 
     components_items = [
-        {
-            'title': component.name,
-            'url': reverse('component_base_settings', kwargs={
-                'pk': component.pk
-            }),
-            'icon': 'angle-right',
-            'active': url_name in [
+        dict(
+            item,
+            icon='angle-right',
+            active=url_name in [
                 'component_base_settings',
                 'component_env_settings',
                 'delete_component',
                 'update_component',
                 'update_component_base_settings',
                 'update_component_env_settings',
-            ] and str(component.pk) == pk,
-            'has_star': component.pk in components_stars
-        }
-        for component in components[:25]
+            ] and str(item['pk']) == pk
+        )
+        for item in menu['components']
     ]
-    if components.count() > 25:
+    if menu['has_more']:
         components_items.append({
             'title': _('Show All'),
             'url': reverse('components'),
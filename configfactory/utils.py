@@ -1,9 +1,14 @@
-import copy
 import json
 import re
+import time
+import uuid
+import zlib
 from collections import OrderedDict
+from functools import lru_cache
 
+import jsonschema
 from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Model
 from django.forms.models import model_to_dict as model_to_dict_default
 from django.utils.translation import ugettext_lazy as _
@@ -22,21 +27,95 @@ pytype_regex = re.compile(r'\"pytype:.+\"')
 
 
 def merge_dict(d1, d2):
-    """Merge two dictionaries."""
+    """Merge two dictionaries.
+
+    Values that are not merged are shared with given dictionaries.
+    """
 
     if not isinstance(d2, dict):
         return d2
 
-    ret = copy.deepcopy(d1)
+    ret = OrderedDict(d1)
 
     for k, v in d2.items():
         if k in ret and isinstance(ret[k], dict):
             ret[k] = merge_dict(ret[k], v)
         else:
-            ret[k] = copy.deepcopy(v)
+            ret[k] = v
     return ret
 
 
+class FrozenDict(OrderedDict):
+    """Read-only ordered dictionary.
+
+    Copies and unpickled instances are regular mutable dictionaries.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        for key, value in OrderedDict(*args, **kwargs).items():
+            OrderedDict.__setitem__(self, key, value)
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Settings dictionary is read-only.')
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    clear = _readonly
+    move_to_end = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __reduce__(self):
+        return OrderedDict, (list(self.items()),)
+
+
+class FrozenList(list):
+    """Read-only list.
+
+    Copies and unpickled instances are regular mutable lists.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Settings list is read-only.')
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __iadd__ = _readonly
+    __imul__ = _readonly
+    append = _readonly
+    clear = _readonly
+    extend = _readonly
+    insert = _readonly
+    pop = _readonly
+    remove = _readonly
+    reverse = _readonly
+    sort = _readonly
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(obj):
+    """Return read-only view of dictionaries and lists structure."""
+
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+
+    if isinstance(obj, dict):
+        return FrozenDict([
+            (key, freeze(value))
+            for key, value in obj.items()
+        ])
+
+    if isinstance(obj, list):
+        return FrozenList([freeze(value) for value in obj])
+
+    return obj
+
+
 def flatten_dict(d, parent_key='', sep='.'):
     """Flatten dictionary keys."""
 
@@ -55,10 +134,53 @@ def flatten_dict(d, parent_key='', sep='.'):
     return OrderedDict(items)
 
 
+def diff_flat_dict(old, new):
+    """Return changed (or added) items and removed keys
+    of flattened dictionary."""
+
+    changed = OrderedDict([
+        (key, value)
+        for key, value in new.items()
+        if key not in old
+        or old[key] != value
+        # Tell apart equal values of different types, like 1 and true
+        or type(old[key]) is not type(value)
+    ])
+
+    removed = [key for key in old if key not in new]
+
+    return changed, removed
+
+
+def select_keys(d, keys, sep='.', parent_key=''):
+    """Select dictionary items by flattened key paths."""
+
+    ret = OrderedDict()
+
+    for k, v in d.items():
+        new_key = sep.join([parent_key, k]) if parent_key else k
+        if new_key in keys:
+            ret[k] = v
+        elif isinstance(v, dict):
+            prefix = new_key + sep
+            if any(key.startswith(prefix) for key in keys):
+                selected = select_keys(v, keys, sep=sep, parent_key=new_key)
+                if selected:
+                    ret[k] = selected
+
+    return ret
+
+
 def cleanse_dict(d, hidden=None, substitute=None):
     """Hide dictionary secured data."""
 
-    ret = copy.deepcopy(d)
+    if hidden is None:
+        hidden = global_settings['cleansed_hidden']
+
+    if substitute is None:
+        substitute = global_settings['cleansed_substitute']
+
+    ret = OrderedDict()
 
     for k, v in d.items():
         if isinstance(v, dict):
@@ -79,10 +201,7 @@ def cleanse_value(key, value, hidden=None, substitute=None):
     if hidden is None:
         hidden = global_settings['cleansed_hidden']
 
-    if isinstance(hidden, str):
-        hidden = hidden.split()
-
-    hidden_re = re.compile('|'.join(hidden), flags=re.IGNORECASE)
+    hidden_re = get_hidden_regex(hidden)
 
     if substitute is None:
         substitute = global_settings['cleansed_substitute']
@@ -106,10 +225,65 @@ def cleanse_value(key, value, hidden=None, substitute=None):
     return cleansed
 
 
+def get_hidden_regex(hidden):
+    """Return compiled hidden keys pattern."""
+    if not isinstance(hidden, str):
+        hidden = tuple(hidden)
+    return _compile_hidden_regex(hidden)
+
+
+@lru_cache(maxsize=32)
+def _compile_hidden_regex(hidden):
+    if isinstance(hidden, str):
+        hidden = hidden.split()
+    return re.compile('|'.join(hidden), flags=re.IGNORECASE)
+
+
 def json_dumps(obj, indent=None):
     return json.dumps(obj, indent=indent)
 
 
+def json_iterdumps(items):
+    """Encode object items to JSON chunk by chunk."""
+
+    yield '{'
+
+    for i, (key, value) in enumerate(items):
+        yield '{delimiter}{key}: {value}'.format(
+            delimiter=', ' if i else '',
+            key=json_dumps(key),
+            value=json_dumps(value)
+        )
+
+    yield '}'
+
+
+def compress(data: bytes, encoding: str = None) -> bytes:
+    """Compress data with gzip or deflate content encoding."""
+    return b''.join(iter_compress([data], encoding))
+
+
+def iter_compress(chunks, encoding: str = None):
+    """Compress data chunk by chunk with gzip or deflate content encoding."""
+
+    if encoding is None:
+        yield from chunks
+        return
+
+    compressor = zlib.compressobj(
+        wbits=31 if encoding == 'gzip' else 15
+    )
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
 def json_loads(s):
     try:
         return json.loads(s, object_pairs_hook=OrderedDict)
@@ -119,6 +293,13 @@ def json_loads(s):
         )
 
 
+def get_inject_keys(content: str) -> list:
+    """Return unique injection keys referenced in content."""
+    return list(OrderedDict.fromkeys(
+        key for whole, key in inject_regex.findall(content)
+    ))
+
+
 def replace_pytype(match):
     content = match.group()
     val = content.replace('\"', '').split(':')[-1]
@@ -132,52 +313,140 @@ def replace_pytype(match):
 def inject_params(
         content: str,
         params: dict,
-        calls: int=0,
         raise_exception: bool=True
 ):
     """Inject params to content."""
 
-    circular_threshold = 100
+    content = ParamsInjector(
+        params=params,
+        raise_exception=raise_exception
+    ).inject(content)
 
-    if calls > circular_threshold:
-        if raise_exception:
-            raise CircularInjectError(
-                'Circular injections detected.'
-            )
-        return content
+    if '"pytype:' in content:
+        content = pytype_regex.sub(replace_pytype, content)
+
+    return content
 
-    calls += 1
 
-    def replace_param(match):
-        whole, key = match.groups()
+class ParamsInjector:
+    """Injection params resolver.
+
+    Every referenced key is resolved exactly once, following its own
+    references depth first, so the resolution order is a topological
+    order of the references graph and cycles are found on the way.
+    """
+
+    unresolved = object()
+
+    def __init__(self, params: dict, raise_exception: bool=True):
+        self.params = params
+        self.raise_exception = raise_exception
+        self._resolved = {}
+        self._path = []
+
+    def inject(self, content: str) -> str:
+        return inject_regex.sub(self._replace_param, content)
+
+    def resolve(self, key: str):
+        """Resolve param value or return `unresolved` marker."""
+
+        if key in self._resolved:
+            return self._resolved[key]
+
+        if key in self._path:
+            if self.raise_exception:
+                path = self._path[self._path.index(key):] + [key]
+                raise CircularInjectError(
+                    'Circular injections detected: {}.'.format(
+                        ' -> '.join(path)
+                    )
+                )
+            return self.unresolved
+
         try:
-            val = params[key]
-            if not isinstance(val, str):
-                return 'pytype:{}'.format(params[key])
-            return val
+            value = self.params[key]
         except KeyError:
-            if raise_exception:
+            if self.raise_exception:
                 raise InjectKeyError(
                     message=_('Injection key `%(key)s` does not exist.') % {
                         'key': key
                     },
                     key=key
                 )
-            return whole
+            value = self.unresolved
+        else:
+            value = self._resolve_value(key, value)
 
-    content = inject_regex.sub(replace_param, content)
+        self._resolved[key] = value
+        return value
 
-    if inject_regex.search(content):
-        return inject_params(
-            content=content,
-            params=params,
-            calls=calls,
-            raise_exception=raise_exception
-        )
+    def _resolve_value(self, key, value):
+        if not isinstance(value, str):
+            return 'pytype:{}'.format(value)
+        self._path.append(key)
+        try:
+            return self.inject(value)
+        finally:
+            self._path.pop()
 
-    content = pytype_regex.sub(replace_pytype, content)
+    def _replace_param(self, match):
+        whole, key = match.groups()
+        value = self.resolve(key)
+        if value is self.unresolved:
+            return whole
+        return value
+
+
+class SettingsInjector(ParamsInjector):
+    """Settings structure params injector.
+
+    Values consisting of a single reference are replaced with the
+    resolved value keeping its type, references inside longer strings
+    are replaced with the value JSON representation.
+    """
+
+    def inject_settings(self, data):
+        if isinstance(data, dict):
+            return OrderedDict([
+                (self.inject(key) if '${' in key else key,
+                 self.inject_settings(value))
+                for key, value in data.items()
+            ])
+        if isinstance(data, list):
+            return [self.inject_settings(value) for value in data]
+        return self.inject_value(data)
+
+    def inject_value(self, value):
+        if not isinstance(value, str) or '${' not in value:
+            return value
+        match = inject_regex.fullmatch(value)
+        if match:
+            resolved = self.resolve(match.group(2))
+            if resolved is self.unresolved:
+                return value
+            return resolved
+        return self.inject(value)
+
+    def _resolve_value(self, key, value):
+        self._path.append(key)
+        try:
+            return self.inject_value(value)
+        finally:
+            self._path.pop()
 
-    return content
+    def _replace_param(self, match):
+        value = super()._replace_param(match)
+        if not isinstance(value, str):
+            return json_dumps(value)
+        return value
+
+
+def inject_settings(data, params: dict, raise_exception: bool=True):
+    """Inject params to settings structure."""
+    return SettingsInjector(
+        params=params,
+        raise_exception=raise_exception
+    ).inject_settings(data)
 
 
 def model_to_dict(instance: Model, fields=None, exclude=None):
@@ -187,26 +456,96 @@ def model_to_dict(instance: Model, fields=None, exclude=None):
         return model_to_dict_default(instance, fields=fields, exclude=exclude)
 
 
-class GlobalSettingsHandler:
-    """Global settings handler."""
+class SharedVersionMixin:
+    """Process memory state kept under a shared cache version.
+
+    A process bumps the version key on every change it makes, others
+    check the key at most once per `check_interval` seconds and drop
+    their state once it changed. The version is bumped once more after
+    commit, so state rebuilt from pre-commit data meanwhile is dropped
+    as well.
+    """
+
+    cache_prefix = None
+
+    check_interval = 1
+
+    _version = None
+
+    _checked_at = None
+
+    def _check_version(self) -> bool:
+        """Return whether the shared version changed since last check."""
+
+        now = time.monotonic()
+
+        if (self._checked_at is not None
+                and now - self._checked_at < self.check_interval):
+            return False
+
+        self._checked_at = now
+
+        version = cache.get(self._make_version_key())
+
+        if version is None:
+            # Lost version must not match the one any process holds.
+            version = self._set_version()
+
+        if version == self._version:
+            return False
+
+        self._version = version
+        return True
+
+    def _bump_version(self) -> str:
+        self._version = self._set_version()
+        self._checked_at = time.monotonic()
+        transaction.on_commit(self._set_version)
+        return self._version
+
+    def _set_version(self) -> str:
+        version = uuid.uuid4().hex
+        cache.set(self._make_version_key(), version, timeout=None)
+        return version
+
+    def _make_version_key(self) -> str:
+        return '{}:version'.format(self.cache_prefix)
+
+
+class GlobalSettingsHandler(SharedVersionMixin):
+    """Global settings handler.
+
+    Values are kept in process memory and reloaded from the shared
+    cache when its version changes.
+    """
 
     cache_prefix = 'global_settings'
 
     def __init__(self):
         self.defaults = GLOBAL_SETTINGS_DEFAULTS
+        self._values = {}
 
     def get(self, key, default=None):
-        return cache.get(
-            self._make_key(key),
-            default=self.defaults.get(key, default)
-        )
+        self._sync()
+        if key in self._values:
+            return self._values[key]
+        return self.defaults.get(key, default)
 
     def set(self, key, value):
-        return cache.set(
-            self._make_key(key),
-            value,
+        self.update({key: value})
+
+    def update(self, values: dict):
+        cache.set_many(
+            {
+                self._make_key(key): value
+                for key, value in values.items()
+            },
             timeout=None
         )
+        # Reload all values, so keys written by other processes
+        # are not shadowed by defaults under the new version.
+        self._bump_version()
+        self._load()
 
     def __getitem__(self, item):
         return self.get(item)
@@ -214,6 +553,22 @@ class GlobalSettingsHandler:
     def __setitem__(self, key, value):
         self.set(key, value)
 
+    def _sync(self):
+        if self._check_version():
+            self._load()
+
+    def _load(self):
+
+        values = cache.get_many([
+            self._make_key(key) for key in self.defaults
+        ])
+
+        self._values = {
+            key: values[self._make_key(key)]
+            for key in self.defaults
+            if self._make_key(key) in values
+        }
+
     def _make_key(self, key):
         return '{}:{}'.format(
             self.cache_prefix,
@@ -222,3 +577,31 @@ class GlobalSettingsHandler:
 
 
 global_settings = GlobalSettingsHandler()
+
+
+class SchemaValidatorsHandler:
+    """Compiled JSON schema validators handler.
+
+    Validators are kept per component together with the schema
+    content they were compiled from, so a changed schema is compiled
+    and checked against its meta-schema only once.
+    """
+
+    def __init__(self):
+        self._validators = {}
+
+    def get(self, component_id: int, content: str):
+        cached = self._validators.get(component_id)
+        if cached is None or cached[0] != content:
+            schema = json_loads(content)
+            cls = jsonschema.validators.validator_for(schema)
+            cls.check_schema(schema)
+            cached = (content, cls(schema))
+            self._validators[component_id] = cached
+        return cached[1]
+
+    def discard(self, component_id: int):
+        self._validators.pop(component_id, None)
+
+
+schema_validators = SchemaValidatorsHandler()
@@ -18,9 +18,9 @@ from django.views.generic import (
     TemplateView,
     UpdateView,
 )
-from guardian.shortcuts import get_objects_for_user, get_perms
+from guardian.shortcuts import get_perms
 
-from configfactory.exceptions import ComponentDeleteError
+from configfactory.exceptions import ComponentDeleteError, ConfigUpdateError
 from configfactory.forms import ConfigForm, JSONSchemaForm
 from configfactory.models import (
     Component,
@@ -37,7 +37,7 @@ from configfactory.services import (
     log_delete_object,
     log_update_object,
     remove_component_star,
-    update_config,
+    validate_component_configs,
 )
 from configfactory.shortcuts import assign_default_perms, get_all_permissions
 from configfactory.utils import model_to_dict
@@ -199,12 +199,11 @@ class ComponentUpdateView(UpdateView):
         self._prev_data = {}
 
     def get_queryset(self):
-        return get_objects_for_user(
+        return Component.objects.with_user_perms(
             user=self.request.user,
             perms=(
                 'change_component',
-            ),
-            klass=Component
+            )
         )
 
     def get_object(self, queryset=None):
@@ -298,12 +297,11 @@ class ComponentDeleteView(DeleteView):
             return self.get(request, *args, **kwargs)
 
     def get_queryset(self):
-        return get_objects_for_user(
+        return Component.objects.with_user_perms(
             user=self.request.user,
             perms=(
                 'delete_component',
-            ),
-            klass=Component
+            )
         )
 
 
@@ -465,11 +463,7 @@ class ComponentSettingsUpdateView(ComponentSettingsView):
 
         if form.is_valid():
 
-            config = update_config(
-                config=config,
-                settings_json=form.cleaned_data['settings_json'],
-                commit=True
-            )
+            config = form.save()
 
             log_update_object(
                 obj=config,
@@ -556,6 +550,8 @@ class ComponentJSONSchemaView(TemplateView):
                 }
             )
 
+            self.check_configs(component, json_schema)
+
         context.update({
             'form': form,
         })
@@ -584,14 +580,34 @@ class ComponentJSONSchemaView(TemplateView):
         return data
 
     def get_components(self):
-        return get_objects_for_user(
+        return Component.objects.with_user_perms(
             user=self.request.user,
             perms=(
                 'change_component',
-            ),
-            klass=Component
+            )
         )
 
+    def check_configs(self, component: Component, json_schema: JSONSchema):
+
+        try:
+            errors = validate_component_configs(component, json_schema)
+        except ConfigUpdateError as e:
+            messages.warning(self.request, str(e))
+            return
+
+        if errors:
+            messages.warning(
+                self.request,
+                _('%(component)s settings do not match new JSON schema '
+                  'in: %(environments)s.') % {
+                    'component': component,
+                    'environments': ', '.join([
+                        str(config.environment or _('Base'))
+                        for config in errors
+                    ]),
+                }
+            )
+
 
 def get_rows_length(content):
     return min(max(len(content.splitlines()), 36), 48)
@@ -51,6 +51,9 @@ setup(
             'pytest',
             'pytest-django',
         ],
+        'msgpack': [
+            'msgpack==0.5.6',
+        ],
     },
     install_requires=requires,
     entry_points="""\
@@ -0,0 +1,517 @@
+import gzip
+import zlib
+from unittest import mock, skipIf
+
+from django.test import TestCase
+from django.urls import reverse
+
+from configfactory.api.renderers import msgpack
+from configfactory.exceptions import InjectKeyError
+from configfactory.models import Component
+from configfactory.services import (
+    get_environments_settings,
+    get_settings,
+    iter_settings,
+)
+from configfactory.snapshots import settings_snapshots
+from configfactory.test.factories import EnvironmentFactory, UserFactory
+from configfactory.utils import compress
+
+
+class SettingsAPITestMixin:
+
+    def setUp(self):
+
+        self.user = UserFactory(
+            is_superuser=True,
+            is_apiuser=True
+        )
+
+        self.dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        self.config = component.configs.get(environment=self.dev)
+        self.config.settings_content = '{"host": "localhost"}'
+        self.config.save()
+
+    def break_injection(self):
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"port": 5432}'
+        params_config.save()
+
+        self.config.settings_content = (
+            '{"host": "localhost", "port": "${param:params.port}"}'
+        )
+        self.config.save()
+
+        params_config.settings_content = '{}'
+        params_config.save()
+
+
+class EnvironmentSettingsAPITestCase(SettingsAPITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api:settings', kwargs={
+            'alias': self.dev.alias
+        })
+
+    def get(self, **extra):
+        return self.client.get(self.url, {
+            'token': self.user.api_token
+        }, **extra)
+
+    def test_get_settings(self):
+
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(
+            response.content.decode(),
+            '{"db": {"host": "localhost"}}'
+        )
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_not_modified(self):
+
+        etag = self.get()['ETag']
+
+        with mock.patch('configfactory.snapshots.get_settings') as render:
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        render.assert_not_called()
+
+    def test_precondition_failed(self):
+
+        etag = self.get()['ETag']
+
+        self.assertEqual(self.get(HTTP_IF_MATCH=etag).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_MATCH='"other"').status_code, 412)
+
+    def test_modified(self):
+
+        etag = self.get()['ETag']
+
+        self.config.settings_content = '{"host": "db.local"}'
+        self.config.save()
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertJSONEqual(
+            response.content.decode(),
+            '{"db": {"host": "db.local"}}'
+        )
+
+    def test_get_selected_settings(self):
+
+        Component.objects.create(
+            name='Cache',
+            alias='cache'
+        )
+
+        with mock.patch(
+            'configfactory.api.views.get_settings',
+            wraps=get_settings
+        ) as render:
+            response = self.client.get(self.url, {
+                'token': self.user.api_token,
+                'components': 'db',
+                'keys': 'db.host'
+            })
+            self.assertEqual(render.call_count, 1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(
+            response.content.decode(),
+            '{"db": {"host": "localhost"}}'
+        )
+
+    def test_stream_settings(self):
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"port": 5432}'
+        params_config.save()
+
+        self.config.settings_content = (
+            '{"host": "localhost", "port": "${param:params.port}"}'
+        )
+        self.config.save()
+
+        for flatten in (False, True):
+
+            params = {
+                'token': self.user.api_token,
+                'flatten': flatten,
+                'stream': True
+            }
+
+            with mock.patch(
+                'configfactory.api.views.iter_settings',
+                wraps=iter_settings
+            ) as render:
+                response = self.client.get(self.url, params)
+                self.assertEqual(render.call_count, 1)
+
+            content = b''.join(response.streaming_content).decode()
+
+            params.pop('stream')
+
+            self.assertJSONEqual(
+                content,
+                self.client.get(self.url, params).content.decode()
+            )
+
+    def test_stream_settings_injection_error(self):
+
+        self.break_injection()
+
+        with self.assertRaises(InjectKeyError):
+            self.client.get(self.url, {
+                'token': self.user.api_token,
+                'stream': True
+            })
+
+    def test_compressed_settings(self):
+
+        with mock.patch(
+            'configfactory.api.views.compress',
+            wraps=compress
+        ) as render:
+            for i in range(2):
+                response = self.get(HTTP_ACCEPT_ENCODING='deflate, gzip;q=0.5')
+                self.assertEqual(response['Content-Encoding'], 'deflate')
+                self.assertJSONEqual(
+                    zlib.decompress(response.content).decode(),
+                    '{"db": {"host": "localhost"}}'
+                )
+
+        self.assertEqual(render.call_count, 1)
+
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertJSONEqual(
+            gzip.decompress(response.content).decode(),
+            '{"db": {"host": "localhost"}}'
+        )
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack_settings(self):
+
+        response = self.get(HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            msgpack.unpackb(response.content, raw=False),
+            {'db': {'host': 'localhost'}}
+        )
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_etag_per_representation(self):
+
+        etags = {
+            self.get()['ETag'],
+            self.get(HTTP_ACCEPT_ENCODING='gzip')['ETag'],
+            self.get(HTTP_ACCEPT='application/msgpack')['ETag'],
+            self.client.get(self.url, {
+                'token': self.user.api_token,
+                'stream': True
+            })['ETag'],
+        }
+
+        self.assertEqual(len(etags), 4)
+
+        response = self.get(
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=self.get()['ETag']
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_stream_msgpack_not_acceptable(self):
+
+        response = self.client.get(self.url, {
+            'token': self.user.api_token,
+            'stream': True
+        }, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response.status_code, 406)
+
+    def test_delta_settings(self):
+
+        self.config.settings_content = (
+            '{"host": "localhost", "port": 5432, "ssl": true}'
+        )
+        self.config.save()
+
+        revision = int(self.get()['X-Settings-Revision'])
+
+        self.config.settings_content = (
+            '{"host": "db.local", "port": 5432, "name": "app"}'
+        )
+        self.config.save()
+
+        response = self.client.get(self.url, {
+            'token': self.user.api_token,
+            'since': revision
+        })
+
+        self.assertGreater(int(response['X-Settings-Revision']), revision)
+        self.assertJSONEqual(response.content.decode(), {
+            'revision': int(response['X-Settings-Revision']),
+            'since': revision,
+            'full': False,
+            'changed': {
+                'db.host': 'db.local',
+                'db.name': 'app',
+            },
+            'removed': [
+                'db.ssl'
+            ]
+        })
+
+        response = self.client.get(self.url, {
+            'token': self.user.api_token,
+            'since': 1
+        })
+
+        self.assertJSONEqual(response.content.decode(), {
+            'revision': int(response['X-Settings-Revision']),
+            'since': 1,
+            'full': True,
+            'changed': {
+                'db.host': 'db.local',
+                'db.port': 5432,
+                'db.name': 'app',
+            },
+            'removed': []
+        })
+
+    def test_delta_since_partial_settings(self):
+
+        params = {
+            'token': self.user.api_token,
+            'keys': 'db.host'
+        }
+
+        with mock.patch(
+            'configfactory.api.views.get_settings',
+            wraps=get_settings
+        ) as render:
+            revision = int(
+                self.client.get(self.url, params)['X-Settings-Revision']
+            )
+            self.client.get(self.url, params)
+            self.assertEqual(render.call_count, 1)
+
+        self.config.settings_content = '{"host": "db.local"}'
+        self.config.save()
+
+        params['since'] = revision
+
+        response = self.client.get(self.url, params)
+
+        self.assertJSONEqual(response.content.decode(), {
+            'revision': int(response['X-Settings-Revision']),
+            'since': revision,
+            'full': False,
+            'changed': {
+                'db.host': 'db.local',
+            },
+            'removed': []
+        })
+
+        response = self.client.get(
+            self.url,
+            params,
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_streamed_settings_without_revision(self):
+
+        response = self.client.get(self.url, {
+            'token': self.user.api_token,
+            'stream': True
+        })
+
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('X-Settings-Revision'))
+
+    def test_full_delta_bodies_not_cached(self):
+
+        for since in range(1, 4):
+            response = self.client.get(self.url, {
+                'token': self.user.api_token,
+                'since': since
+            })
+            self.assertEqual(response.status_code, 200)
+
+        snapshot = settings_snapshots.get(self.dev, flatten=True)
+
+        self.assertDictEqual(snapshot._bodies, {})
+
+    def test_authenticated_without_queries(self):
+
+        response = self.get()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+            self.assertEqual(
+                self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                304
+            )
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get().status_code, 403)
+
+
+class EnvironmentSettingsWatchAPITestCase(SettingsAPITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api:watch_settings', kwargs={
+            'alias': self.dev.alias
+        })
+
+    def watch(self, revision, timeout=0):
+        return self.client.get(self.url, {
+            'token': self.user.api_token,
+            'revision': revision,
+            'timeout': timeout
+        })
+
+    def test_watch_returns_newer_settings(self):
+
+        response = self.watch(revision=0)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(
+            response.content.decode(),
+            '{"db": {"host": "localhost"}}'
+        )
+
+    def test_watch_timeout(self):
+
+        revision = int(self.watch(revision=0)['X-Settings-Revision'])
+
+        response = self.watch(revision=revision)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(int(response['X-Settings-Revision']), revision)
+
+    def test_watch_parked_by_server(self):
+
+        revision = int(self.watch(revision=0)['X-Settings-Revision'])
+        watch = {}
+
+        with mock.patch('configfactory.snapshots.time.sleep') as sleep:
+            response = self.client.get(self.url, {
+                'token': self.user.api_token,
+                'revision': revision,
+                'timeout': 60
+            }, **{
+                'configfactory.watch': watch
+            })
+
+        self.assertEqual(response.status_code, 304)
+        self.assertDictEqual(watch, {
+            'environment_id': self.dev.pk,
+            'revision': revision,
+            'timeout': 60
+        })
+        sleep.assert_not_called()
+
+
+class BulkSettingsAPITestCase(SettingsAPITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api:bulk_settings')
+        self.prod = EnvironmentFactory(
+            name='Production',
+            alias='production'
+        )
+
+    def get(self, **params):
+        params['token'] = self.user.api_token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_get_settings(self):
+
+        self.assertJSONEqual(self.get(), {
+            'development': {
+                'db': {
+                    'host': 'localhost'
+                }
+            },
+            'production': {
+                'db': {}
+            }
+        })
+
+    def test_get_settings_filtered(self):
+
+        self.assertJSONEqual(self.get(environments='production'), {
+            'production': {
+                'db': {}
+            }
+        })
+
+    def test_get_settings_injection_error(self):
+
+        self.break_injection()
+
+        with self.assertRaises(InjectKeyError):
+            self.client.get(self.url, {
+                'token': self.user.api_token
+            })
+
+    def test_snapshots_rendered_together(self):
+
+        with mock.patch(
+            'configfactory.snapshots.get_environments_settings',
+            wraps=get_environments_settings
+        ) as render:
+            self.get()
+            self.get()
+
+        self.assertEqual(render.call_count, 2)
+        self.assertListEqual(
+            [
+                [environment.alias for environment in call[1]['environments']]
+                for call in render.call_args_list
+            ],
+            [
+                ['development', 'production'],
+                []
+            ]
+        )
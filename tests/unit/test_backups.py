@@ -0,0 +1,105 @@
+from django.test import TestCase
+
+from configfactory.backups import export_records, import_records
+from configfactory.exceptions import DataImportError
+from configfactory.models import Component, Environment, InjectionReference
+from configfactory.services import get_settings
+from configfactory.test.factories import EnvironmentFactory
+
+
+class BackupsTestCase(TestCase):
+
+    def setUp(self):
+
+        self.dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"host": "localhost"}'
+        params_config.save()
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db',
+            use_schema=True
+        )
+        db_component.json_schema.schema_json = '{"type": "object"}'
+        db_component.json_schema.save()
+        db_config = db_component.configs.get(environment=self.dev)
+        db_config.settings_content = '{"host": "${param:params.host}"}'
+        db_config.save()
+
+    def test_export_import(self):
+
+        settings = get_settings(environment=self.dev, inject=True)
+
+        records = list(export_records())
+
+        self.assertListEqual(
+            [record['model'] for record in records],
+            ['environment', 'component', 'component', 'json_schema',
+             'config', 'config', 'config']
+        )
+
+        Component.objects.all().delete()
+        Environment.objects.all().delete()
+
+        with self.assertNumQueries(19):
+            import_records(records, batch_size=4)
+
+        environment = Environment.objects.get(alias='development')
+
+        self.assertDictEqual(
+            get_settings(environment=environment, inject=True),
+            settings
+        )
+
+        self.assertEqual(
+            Component.objects.get(alias='db').json_schema.content,
+            '{"type": "object"}'
+        )
+
+        self.assertListEqual(
+            list(
+                InjectionReference.objects.values_list(
+                    'config__component__alias',
+                    'config__environment__alias',
+                    'key'
+                )
+            ),
+            [('db', 'development', 'params.host')]
+        )
+
+    def test_import_failed(self):
+
+        records = list(export_records())
+
+        Component.objects.all().delete()
+        Environment.objects.all().delete()
+
+        with self.assertRaises(DataImportError):
+            import_records(records[:4] + [{
+                'model': 'config',
+                'component': 'unknown',
+                'environment': None,
+                'content': '{}'
+            }], batch_size=4)
+
+        self.assertFalse(Environment.objects.exists())
+        self.assertFalse(Component.objects.exists())
+
+        import_records(records, batch_size=4)
+
+        self.assertEqual(InjectionReference.objects.count(), 1)
+
+    def test_import_not_empty(self):
+
+        with self.assertRaises(DataImportError):
+            import_records(list(export_records()))
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from configfactory.bundles import Bundle, build_bundle, dump_bundle
+from configfactory.exceptions import BundleError
+from configfactory.models import Component
+from configfactory.test.factories import EnvironmentFactory
+
+
+class BundlesTestCase(TestCase):
+
+    def setUp(self):
+
+        self.dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"host": "localhost"}'
+        params_config.save()
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        self.db_config = db_component.configs.get(environment=self.dev)
+        self.db_config.settings_content = (
+            '{"host": "${param:params.host}", "port": 5432}'
+        )
+        self.db_config.save()
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'development.cfb')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_bundle_lookup(self):
+
+        self.assertTrue(build_bundle(self.dev, self.path, flatten=True))
+
+        with Bundle(self.path) as bundle:
+
+            self.assertTrue(bundle.flatten)
+            self.assertEqual(len(bundle), 3)
+            self.assertEqual(bundle['db.host'], 'localhost')
+            self.assertEqual(bundle['db.port'], 5432)
+            self.assertNotIn('db', bundle)
+            self.assertIsNone(bundle.get('db.user'))
+            self.assertListEqual(
+                list(bundle.keys()),
+                ['db.host', 'db.port', 'params.host']
+            )
+
+    def test_bundle_rebuilt_on_change(self):
+
+        self.assertTrue(build_bundle(self.dev, self.path))
+        self.assertFalse(build_bundle(self.dev, self.path))
+
+        # Saved but unchanged settings refresh revision only
+        self.db_config.save()
+
+        self.assertFalse(build_bundle(self.dev, self.path))
+
+        with Bundle(self.path) as bundle:
+            revision = bundle.revision
+            self.assertDictEqual(bundle['db'], {
+                'host': 'localhost',
+                'port': 5432
+            })
+
+        self.db_config.settings_content = '{"port": 5433}'
+        self.db_config.save()
+
+        self.assertTrue(build_bundle(self.dev, self.path))
+
+        with Bundle(self.path) as bundle:
+            self.assertGreater(bundle.revision, revision)
+            self.assertDictEqual(bundle['db'], {
+                'port': 5433
+            })
+
+    def test_bundle_checksum(self):
+
+        content = bytearray(dump_bundle({'db': {'port': 5432}}, revision=1))
+        content[-2] = ord('3')
+
+        with open(self.path, 'wb') as f:
+            f.write(content)
+
+        with self.assertRaises(BundleError):
+            Bundle(self.path)
+
+        with Bundle(self.path, verify=False) as bundle:
+            self.assertDictEqual(bundle['db'], {'port': 5433})
+
+    def test_bundle_header_checksum(self):
+
+        content = dump_bundle({'db': {'port': 5432}}, revision=1)
+
+        for offset in (
+                # Flags
+                11,
+                # Keys count
+                23,
+        ):
+            corrupted = bytearray(content)
+            corrupted[offset] ^= 0xff
+
+            with open(self.path, 'wb') as f:
+                f.write(corrupted)
+
+            with self.assertRaises(BundleError):
+                Bundle(self.path)
+
+        # Revision is refreshed in place and not verified
+        corrupted = bytearray(content)
+        corrupted[19] = 2
+
+        with open(self.path, 'wb') as f:
+            f.write(corrupted)
+
+        with Bundle(self.path) as bundle:
+            self.assertEqual(bundle.revision, 2)
+
+    def test_bundle_count_exceeds_size(self):
+
+        content = bytearray(dump_bundle({'db': {'port': 5432}}, revision=1))
+        content[23] = 0xff
+
+        with open(self.path, 'wb') as f:
+            f.write(content)
+
+        with self.assertRaises(BundleError):
+            Bundle(self.path, verify=False)
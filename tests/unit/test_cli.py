@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+
+from click.testing import CliRunner
+from django.test import TestCase
+
+from configfactory.cli import render
+from configfactory.models import Component
+from configfactory.test.factories import EnvironmentFactory
+from configfactory.utils import global_settings
+
+
+class RenderTestCase(TestCase):
+
+    def setUp(self):
+
+        self.dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        self.prod = EnvironmentFactory(
+            name='Production',
+            alias='production'
+        )
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        db_config = db_component.configs.base().get()
+        db_config.settings_content = '{"host": "localhost"}'
+        db_config.save()
+
+        db_config = db_component.configs.get(environment=self.prod)
+        db_config.settings_content = '{"host": "db.example.com"}'
+        db_config.save()
+
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+        self.runner = CliRunner()
+
+    def test_render_stdout(self):
+
+        result = self.runner.invoke(render, ['development', '-p', '1'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(json.loads(result.output), {
+            'db': {
+                'host': 'localhost'
+            }
+        })
+
+    def test_render_default_indent(self):
+
+        result = self.runner.invoke(render, ['development', '-p', '1'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn(
+            '\n' + ' ' * global_settings['indent'] + '"db"',
+            result.output
+        )
+
+        result = self.runner.invoke(render, [
+            'development', '-p', '1', '--indent', '0'
+        ])
+
+        self.assertIn('\n"db"', result.output)
+
+    def test_render_output_dir(self):
+
+        result = self.runner.invoke(render, [
+            '--output-dir', self.output_dir, '-p', '1', '--flatten'
+        ])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)),
+            ['development.json', 'production.json']
+        )
+
+        with open(os.path.join(self.output_dir, 'production.json')) as f:
+            self.assertEqual(json.load(f), {
+                'db.host': 'db.example.com'
+            })
+
+    def test_render_many_requires_output_dir(self):
+
+        result = self.runner.invoke(render, ['-p', '1'])
+
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Output directory is required', result.output)
+
+    def test_render_unknown_environment(self):
+
+        result = self.runner.invoke(render, ['staging', '-p', '1'])
+
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Unknown environments: staging', result.output)
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from configfactory.menus import sidebar_menus
+from configfactory.models import Component
+from configfactory.services import add_component_star
+from configfactory.test.factories import UserFactory
+
+
+class SidebarMenuTestCase(TestCase):
+
+    def setUp(self):
+
+        self.user = UserFactory(is_superuser=True)
+
+        Component.objects.create(
+            name='Cache',
+            alias='cache'
+        )
+
+        self.db = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+
+    def get_titles(self):
+        return [
+            item['title']
+            for item in sidebar_menus.get(self.user)['components']
+        ]
+
+    def test_menu_cached_until_change(self):
+
+        self.assertListEqual(self.get_titles(), ['Cache', 'Database'])
+
+        with self.assertNumQueries(0):
+            self.assertListEqual(self.get_titles(), ['Cache', 'Database'])
+
+        add_component_star(self.user, self.db)
+
+        self.assertListEqual(self.get_titles(), ['Database', 'Cache'])
+        self.assertTrue(sidebar_menus.get(self.user)['components'][0]['has_star'])
+
+        Component.objects.create(
+            name='Queue',
+            alias='queue'
+        )
+
+        self.assertListEqual(
+            self.get_titles(),
+            ['Database', 'Cache', 'Queue']
+        )
+
+    def test_menu_rebuilt_after_commit(self):
+
+        with mock.patch('configfactory.menus.transaction.on_commit') as on_commit:
+            Component.objects.create(
+                name='Queue',
+                alias='queue'
+            )
+
+        # Built before commit by another worker
+        menu = sidebar_menus.get(self.user)
+
+        for call in on_commit.call_args_list:
+            call[0][0]()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(sidebar_menus.get(self.user), menu)
@@ -1,9 +1,14 @@
+import copy
 from collections import OrderedDict
+from unittest import mock
 
+from django.contrib.auth.models import Group, Permission
 from django.test import TestCase
+from guardian.shortcuts import assign_perm, remove_perm
 
-from configfactory.models import Component, Config
+from configfactory.models import Component, Config, User
 from configfactory.services import get_settings
+from configfactory.shortcuts import UserPermsHandler
 from configfactory.test.factories import EnvironmentFactory
 
 
@@ -107,6 +112,29 @@ class ConfigTestCase(TestCase):
             '{"a": 100}'
         )
 
+    def test_settings_memoization(self):
+
+        config = Config(settings_content='{"a": {"b": [1, 2]}}')
+
+        settings = config.settings
+
+        self.assertIs(config.settings, settings)
+
+        with self.assertRaises(TypeError):
+            settings['a'] = 100
+
+        with self.assertRaises(TypeError):
+            settings['a']['b'].append(3)
+
+        settings_copy = copy.deepcopy(settings)
+        settings_copy['a']['b'].append(3)
+
+        self.assertEqual(settings['a']['b'], [1, 2])
+
+        config.settings_json = '{"a": 200}'
+
+        self.assertDictEqual(config.settings, {'a': 200})
+
     def test_component_create_environments(self):
 
         EnvironmentFactory(
@@ -197,3 +225,77 @@ class ConfigTestCase(TestCase):
             get_settings(dev_config, flatten=True, raw=True),
             '{"a": 100, "b.c": 1000}'
         )
+
+
+class WithUserPermsTestCase(TestCase):
+
+    def test_user_perms_rebuilt_after_commit(self):
+
+        user = User.objects.create(username='reader', email='reader@localhost')
+        db = Component.objects.create(name='Database', alias='db')
+
+        worker = UserPermsHandler()
+        worker.check_interval = 0
+
+        with mock.patch('configfactory.utils.transaction.on_commit') as on_commit:
+            assign_perm('view_component', user, db)
+
+        # Built before commit by another worker
+        perms = worker.get(user)
+
+        for callback in {call[0][0] for call in on_commit.call_args_list}:
+            callback()
+
+        self.assertIsNot(worker.get(user), perms)
+
+    def test_with_user_perms(self):
+
+        user = User.objects.create(username='reader', email='reader@localhost')
+        group = Group.objects.create(name='Readers')
+
+        db = Component.objects.create(name='Database', alias='db')
+        cache = Component.objects.create(name='Cache', alias='cache')
+        Component.objects.create(name='Queue', alias='queue')
+
+        def get_aliases(*perms):
+            return set(
+                Component.objects
+                .with_user_perms(user=user, perms=perms)
+                .values_list('alias', flat=True)
+            )
+
+        self.assertSetEqual(get_aliases('view_component'), set())
+
+        assign_perm('view_component', user, db)
+        assign_perm('change_component', user, db)
+        assign_perm('view_component', group, cache)
+
+        # Permissions are loaded once until changed
+        get_aliases('view_component')
+
+        with self.assertNumQueries(1):
+            self.assertSetEqual(get_aliases('view_component'), {'db'})
+
+        user.groups.add(group)
+
+        self.assertSetEqual(get_aliases('view_component'), {'db', 'cache'})
+        self.assertSetEqual(
+            get_aliases('view_component', 'change_component'),
+            {'db'}
+        )
+
+        remove_perm('change_component', user, db)
+
+        self.assertSetEqual(
+            get_aliases('view_component', 'change_component'),
+            set()
+        )
+
+        user.user_permissions.add(
+            Permission.objects.get(codename='view_component')
+        )
+
+        self.assertSetEqual(
+            get_aliases('view_component'),
+            {'db', 'cache', 'queue'}
+        )
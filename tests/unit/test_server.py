@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from configfactory.server import (
+    ParkedRequest,
+    ParkRequest,
+    SettingsWatchers,
+    WatchApplication,
+)
+from configfactory.snapshots import settings_revisions
+
+
+class ServerTestCase(TestCase):
+
+    def test_watch_application_parks_unchanged_request(self):
+
+        def app(environ, start_response):
+            watch = environ['configfactory.watch']
+            if watch is not None:
+                watch.update(environment_id=1, revision=5, timeout=30)
+            start_response('304 Not Modified', [])
+            return []
+
+        start_response = mock.Mock()
+        application = WatchApplication(app)
+
+        with self.assertRaises(ParkRequest) as context:
+            application({}, start_response)
+
+        self.assertEqual(context.exception.revision, 5)
+        start_response.assert_not_called()
+
+        application.local.resuming = True
+        application({}, start_response)
+
+        start_response.assert_called_once_with('304 Not Modified', [], None)
+
+    def test_watchers_resume_changed_requests(self):
+
+        worker = mock.Mock()
+        watchers = SettingsWatchers(worker=worker)
+        revision = settings_revisions.get(1)
+
+        changed = ParkedRequest(
+            listener=None,
+            req=None,
+            client=None,
+            addr=None,
+            park=ParkRequest(environment_id=1, revision=0, timeout=30)
+        )
+        unchanged = ParkedRequest(
+            listener=None,
+            req=None,
+            client=None,
+            addr=None,
+            park=ParkRequest(environment_id=1, revision=revision, timeout=30)
+        )
+        expired = ParkedRequest(
+            listener=None,
+            req=None,
+            client=None,
+            addr=None,
+            park=ParkRequest(environment_id=1, revision=revision, timeout=0)
+        )
+
+        for request in (changed, unchanged, expired):
+            watchers.park(request)
+
+        watchers.check()
+
+        self.assertListEqual(
+            [call[0][0] for call in worker.resume.call_args_list],
+            [changed, expired]
+        )
+
+        settings_revisions.bump(1)
+        watchers.check()
+
+        worker.resume.assert_called_with(unchanged)
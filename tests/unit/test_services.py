@@ -1,9 +1,24 @@
 from unittest import mock
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from guardian.shortcuts import assign_perm
 
-from configfactory.models import Component
-from configfactory.services import get_settings, generate_api_token
+from configfactory.exceptions import ComponentDeleteError, ConfigUpdateError
+from configfactory.models import Component, Config, InjectionReference
+from configfactory.services import (
+    delete_component,
+    duplicate_environment,
+    generate_api_token,
+    get_all_settings,
+    get_environments_settings,
+    get_injection_dependencies,
+    get_settings,
+    update_config,
+    validate_component_configs,
+    validate_config,
+)
 from configfactory.test.factories import EnvironmentFactory, UserFactory
 
 
@@ -104,6 +119,95 @@ class ServicesTestCase(TestCase):
 
         self.assertDictEqual(data, expected)
 
+    def test_get_all_settings_queries(self):
+
+        dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        user = UserFactory()
+
+        def add_components(start, count):
+            for i in range(start, start + count):
+                component = Component.objects.create(
+                    name='Component {}'.format(i),
+                    alias='component_{}'.format(i),
+                    is_global=i % 3 == 0
+                )
+                assign_perm('view_component', user, component)
+
+        add_components(0, 2)
+
+        Component.objects.create(
+            name='Hidden',
+            alias='hidden'
+        )
+
+        with self.assertNumQueries(1):
+            self.assertListEqual(
+                list(get_all_settings(dev, user=user)),
+                ['component_0', 'component_1']
+            )
+
+        add_components(2, 8)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(get_all_settings(dev, user=user)), 10)
+
+    def test_get_environments_settings(self):
+
+        environments = [
+            EnvironmentFactory(
+                name='Environment {}'.format(i),
+                alias='environment_{}'.format(i)
+            )
+            for i in range(3)
+        ]
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"host": "localhost"}'
+        params_config.save()
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        for environment in environments:
+            db_config = db_component.configs.get(environment=environment)
+            db_config.settings_content = (
+                '{"host": "${param:params.host}", "name": "%s"}'
+                % environment.alias
+            )
+            db_config.save()
+
+        rendered = get_environments_settings(
+            environments=environments,
+            flatten=True,
+            inject=True
+        )
+
+        # Base configs once and environment configs one at a time
+        with self.assertNumQueries(2):
+            environment, data = next(rendered)
+
+        self.assertEqual(environment, environments[0])
+
+        for environment, data in [(environment, data)] + list(rendered):
+            self.assertDictEqual(
+                data,
+                get_settings(
+                    environment=environment,
+                    flatten=True,
+                    inject=True
+                )
+            )
+
     def test_generate_api_token(self):
 
         user = UserFactory()
@@ -121,3 +225,341 @@ class ServicesTestCase(TestCase):
             token = generate_api_token()
 
             self.assertEqual(token, 'bbb')
+
+    def test_injection_references_index(self):
+
+        dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        update_config(
+            config=params_component.configs.base().get(),
+            settings_json='{"host": "localhost"}'
+        )
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        update_config(
+            config=db_component.configs.base().get(),
+            settings_json='{"host": "${param:params.host}"}'
+        )
+
+        self.assertSetEqual(
+            set(
+                InjectionReference.objects
+                .values_list('config__environment', 'key')
+            ),
+            {
+                (None, 'params.host'),
+                (dev.pk, 'params.host'),
+            }
+        )
+
+        with self.assertRaises(ConfigUpdateError):
+            update_config(
+                config=params_component.configs.base().get(),
+                settings_json='{"port": 5555}'
+            )
+
+        with self.assertRaises(ComponentDeleteError):
+            delete_component(params_component)
+
+        update_config(
+            config=db_component.configs.get(environment=dev),
+            settings_json='{"host": "db.local"}'
+        )
+
+        self.assertSetEqual(
+            set(
+                InjectionReference.objects
+                .values_list('config__environment', 'key')
+            ),
+            {
+                (None, 'params.host'),
+            }
+        )
+
+        delete_component(db_component)
+        delete_component(params_component)
+
+        self.assertFalse(Component.objects.exists())
+
+    def test_validate_component_configs(self):
+
+        dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        component = Component.objects.create(
+            name='Database',
+            alias='db',
+            use_schema=True
+        )
+        update_config(
+            config=component.configs.base().get(),
+            settings_json='{"port": 5432}'
+        )
+
+        json_schema = component.json_schema
+        json_schema.schema_json = (
+            '{"properties": {"port": {"type": "integer"}}}'
+        )
+        json_schema.save()
+
+        dev_config = component.configs.get(environment=dev)
+
+        with mock.patch(
+            'jsonschema.Draft4Validator.check_schema'
+        ) as check_schema:
+            with self.assertRaises(ConfigUpdateError):
+                update_config(
+                    config=dev_config,
+                    settings_json='{"port": "5432"}'
+                )
+            update_config(
+                config=dev_config,
+                settings_json='{"port": 5433}'
+            )
+            self.assertEqual(check_schema.call_count, 1)
+
+        self.assertDictEqual(validate_component_configs(component), {})
+
+        json_schema.schema_json = (
+            '{"properties": {"port": {"type": "string"}}}'
+        )
+        json_schema.save()
+
+        errors = validate_component_configs(component)
+
+        self.assertListEqual(
+            [config.environment for config in errors],
+            [None, dev]
+        )
+
+    def test_validate_config(self):
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        update_config(
+            config=params_config,
+            settings_json='{"host": "localhost"}'
+        )
+
+        db_config = Component.objects.create(
+            name='Database',
+            alias='db'
+        ).configs.base().get()
+
+        with self.assertRaises(ConfigUpdateError):
+            validate_config(
+                config=db_config,
+                settings_json='{"host": "${param:params.port}"}'
+            )
+
+        validate_config(
+            config=db_config,
+            settings_json='{"host": "${param:params.host}"}'
+        )
+
+        self.assertFalse(InjectionReference.objects.exists())
+
+        db_config.save()
+
+        with self.assertRaises(ConfigUpdateError):
+            validate_config(
+                config=params_config,
+                settings_json='{"port": 5555}'
+            )
+
+        validate_config(
+            config=db_config,
+            settings_json='{"host": "db.local"}'
+        ).save()
+
+        validate_config(
+            config=params_config,
+            settings_json='{"port": 5555}'
+        )
+
+    def test_get_selected_settings(self):
+
+        dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        update_config(
+            config=params_component.configs.base().get(),
+            settings_json='{"host": "localhost", "port": 5432}'
+        )
+
+        hosts_component = Component.objects.create(
+            name='Hosts',
+            alias='hosts'
+        )
+        update_config(
+            config=hosts_component.configs.base().get(),
+            settings_json='{"db": "${param:params.host}"}'
+        )
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        update_config(
+            config=db_component.configs.base().get(),
+            settings_json=(
+                '{"host": "${param:hosts.db}", '
+                '"port": "${param:params.port}", '
+                '"name": "app"}'
+            )
+        )
+
+        Component.objects.create(
+            name='Cache',
+            alias='cache'
+        )
+
+        self.assertSetEqual(
+            get_injection_dependencies(dev, ['db']),
+            {'db', 'hosts', 'params'}
+        )
+
+        self.assertDictEqual(
+            get_settings(
+                environment=dev,
+                components=['db'],
+                keys=['db.host', 'db.port'],
+                inject=True
+            ),
+            {
+                'db': {
+                    'host': 'localhost',
+                    'port': 5432
+                }
+            }
+        )
+
+    def test_create_environment_configs_queries(self):
+
+        def create_environment(alias):
+            with CaptureQueriesContext(connection) as context:
+                environment = EnvironmentFactory(name=alias, alias=alias)
+            return environment, len(context)
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"host": "localhost"}'
+        params_config.save()
+
+        for i in range(3):
+            component = Component.objects.create(
+                name='Component {}'.format(i),
+                alias='component{}'.format(i)
+            )
+            config = component.configs.base().get()
+            config.settings_content = '{"host": "${param:params.host}"}'
+            config.save()
+
+        _, num_queries = create_environment('development')
+
+        for i in range(3, 10):
+            Component.objects.create(
+                name='Component {}'.format(i),
+                alias='component{}'.format(i)
+            )
+
+        environment, more_num_queries = create_environment('production')
+
+        self.assertEqual(more_num_queries, num_queries)
+
+        self.assertEqual(
+            Config.objects.filter(environment=environment).count(),
+            10
+        )
+
+        self.assertEqual(
+            InjectionReference.objects.filter(
+                config__environment=environment,
+                key='params.host'
+            ).count(),
+            3
+        )
+
+        self.assertSetEqual(
+            get_injection_dependencies(environment, ['component0']),
+            {'component0', 'params'}
+        )
+
+    def test_duplicate_environment(self):
+
+        user = UserFactory()
+
+        production = EnvironmentFactory(
+            name='Production',
+            alias='production'
+        )
+
+        assign_perm('view_environment', user, production)
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"host": "localhost"}'
+        params_config.save()
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        db_config = db_component.configs.get(environment=production)
+        db_config.settings_content = '{"host": "${param:params.host}"}'
+        db_config.save()
+
+        staging = duplicate_environment(
+            environment=production,
+            name='Staging',
+            alias='staging'
+        )
+
+        self.assertEqual(
+            db_component.configs.get(environment=staging).settings_content,
+            '{"host": "${param:params.host}"}'
+        )
+
+        self.assertDictEqual(
+            get_settings(environment=staging, inject=True),
+            get_settings(environment=production, inject=True)
+        )
+
+        self.assertSetEqual(
+            get_injection_dependencies(staging, ['db']),
+            {'db', 'params'}
+        )
+
+        self.assertTrue(user.has_perm('view_environment', staging))
@@ -0,0 +1,83 @@
+from django.test import TestCase
+
+from configfactory.models import Component
+from configfactory.snapshots import settings_revisions, settings_snapshots
+from configfactory.test.factories import EnvironmentFactory
+
+
+class SnapshotsTestCase(TestCase):
+
+    def setUp(self):
+
+        self.dev = EnvironmentFactory(
+            name='Development',
+            alias='development'
+        )
+
+        params_component = Component.objects.create(
+            name='Parameters',
+            alias='params',
+            is_global=True
+        )
+        params_config = params_component.configs.base().get()
+        params_config.settings_content = '{"host": "localhost"}'
+        params_config.save()
+
+        db_component = Component.objects.create(
+            name='Database',
+            alias='db'
+        )
+        db_config = db_component.configs.base().get()
+        db_config.settings_content = '{"host": "${param:params.host}"}'
+        db_config.save()
+
+        self.db_config = db_component.configs.get(environment=self.dev)
+
+    def test_snapshot_reused_until_change(self):
+
+        snapshot = settings_snapshots.get(self.dev)
+
+        self.assertDictEqual(snapshot.data, {
+            'db': {
+                'host': 'localhost'
+            },
+            'params': {
+                'host': 'localhost'
+            }
+        })
+
+        self.assertIs(settings_snapshots.get(self.dev), snapshot)
+
+        self.db_config.settings_content = '{"host": "db.local"}'
+        self.db_config.save()
+
+        new_snapshot = settings_snapshots.get(self.dev)
+
+        self.assertGreater(new_snapshot.revision, snapshot.revision)
+        self.assertEqual(new_snapshot.data['db']['host'], 'db.local')
+
+    def test_revision_bumped_by_global_change(self):
+
+        revision = settings_revisions.get(self.dev.pk)
+
+        self.assertEqual(settings_revisions.get(self.dev.pk), revision)
+
+        Component.objects.create(
+            name='Cache',
+            alias='cache'
+        )
+
+        self.assertGreater(settings_revisions.get(self.dev.pk), revision)
+
+    def test_snapshot_filter(self):
+
+        snapshot = settings_snapshots.get(self.dev, flatten=True)
+
+        self.assertDictEqual(
+            snapshot.filter(components=['db']),
+            {
+                'db.host': 'localhost'
+            }
+        )
+
+        self.assertIs(snapshot.filter(), snapshot.data)
@@ -1,14 +1,21 @@
 from collections import OrderedDict
+from unittest import mock
 
 from django.test import TestCase
 
 from configfactory.exceptions import CircularInjectError
 from configfactory.models import GlobalSettings
 from configfactory.utils import (
+    GlobalSettingsHandler,
     cleanse_dict,
     cleanse_value,
+    diff_flat_dict,
+    get_hidden_regex,
     global_settings,
     inject_params,
+    inject_settings,
+    merge_dict,
+    select_keys,
 )
 
 
@@ -111,6 +118,95 @@ class UtilsTestCase(TestCase):
             }
         )
 
+    def test_merge_dict(self):
+
+        d1 = OrderedDict([
+            ('a', OrderedDict([
+                ('b', 1),
+                ('c', 2),
+            ])),
+            ('d', OrderedDict([
+                ('e', [1, 2]),
+            ])),
+        ])
+
+        d2 = OrderedDict([
+            ('a', OrderedDict([
+                ('c', 20),
+            ])),
+        ])
+
+        merged = merge_dict(d1, d2)
+
+        self.assertDictEqual(merged, {
+            'a': {
+                'b': 1,
+                'c': 20,
+            },
+            'd': {
+                'e': [1, 2],
+            },
+        })
+
+        # Not merged values are shared, given dictionaries are intact
+        self.assertIs(merged['d'], d1['d'])
+        self.assertEqual(d1['a']['c'], 2)
+
+    def test_hidden_regex_cache(self):
+
+        self.assertIs(
+            get_hidden_regex('password secret'),
+            get_hidden_regex('password secret')
+        )
+
+        self.assertIs(
+            get_hidden_regex(['password', 'secret']),
+            get_hidden_regex(['password', 'secret'])
+        )
+
+    def test_diff_flat_dict(self):
+
+        changed, removed = diff_flat_dict(
+            OrderedDict([('a', 1), ('b', 1), ('c', 1)]),
+            OrderedDict([('a', 1), ('b', True), ('d', 1)])
+        )
+
+        self.assertDictEqual(changed, {'b': True, 'd': 1})
+        self.assertListEqual(removed, ['c'])
+
+    def test_select_keys(self):
+
+        d = OrderedDict([
+            ('db', OrderedDict([
+                ('host', 'localhost'),
+                ('port', 5432),
+                ('options', OrderedDict([
+                    ('timeout', 10),
+                    ('ssl', True),
+                ])),
+            ])),
+            ('cache', OrderedDict([
+                ('host', 'localhost'),
+            ])),
+        ])
+
+        self.assertDictEqual(
+            select_keys(d, {'db.port', 'db.options.ssl', 'cache'}),
+            {
+                'db': {
+                    'port': 5432,
+                    'options': {
+                        'ssl': True
+                    }
+                },
+                'cache': {
+                    'host': 'localhost'
+                }
+            }
+        )
+
+        self.assertDictEqual(select_keys(d, {'db.name', 'db.host.x'}), {})
+
     def test_default_global_settings(self):
 
         global_values = GlobalSettings.objects.get()
@@ -135,6 +231,31 @@ class UtilsTestCase(TestCase):
         self.assertEqual(global_settings['indent'], 2)
         self.assertEqual(global_settings['cleansed_hidden'], '***')
 
+    def test_global_settings_shared_between_processes(self):
+
+        worker = GlobalSettingsHandler()
+        worker.check_interval = 0
+
+        global_settings['indent'] = 3
+
+        with mock.patch('configfactory.utils.cache.get_many') as get_many:
+            self.assertEqual(global_settings['indent'], 3)
+            get_many.assert_not_called()
+
+        self.assertEqual(worker['indent'], 3)
+
+        global_settings['indent'] = 6
+
+        self.assertEqual(worker['indent'], 6)
+
+        global_settings['cleansed_substitute'] = 'XXX'
+
+        writer = GlobalSettingsHandler()
+        writer['indent'] = 7
+
+        self.assertEqual(writer['cleansed_substitute'], 'XXX')
+        self.assertEqual(writer['indent'], 7)
+
     def test_inject_param(self):
 
         content = "a = ${param:a}"
@@ -214,3 +335,84 @@ class UtilsTestCase(TestCase):
             inject_params(content, params={
                 'a.a': '${param:a.a}',
             })
+
+    def test_circular_inject_params_path(self):
+
+        content = "a = ${param:a}"
+
+        with self.assertRaisesRegex(
+            CircularInjectError,
+            'a -> b -> c -> a'
+        ):
+            inject_params(content, params={
+                'a': '${param:b}',
+                'b': '${param:c}',
+                'c': '${param:a}',
+            })
+
+    def test_inject_params_pytypes(self):
+
+        content = (
+            '{\n'
+            '    "port": "${param:port}",\n'
+            '    "debug": "${param:debug}"\n'
+            '}'
+        )
+
+        self.assertEqual(
+            inject_params(content, params={
+                'port': '${param:default_port}',
+                'default_port': 5555,
+                'debug': False,
+            }),
+            '{\n'
+            '    "port": 5555,\n'
+            '    "debug": false\n'
+            '}'
+        )
+
+    def test_inject_params_without_validation(self):
+
+        content = "a = ${param:a}, b = ${param:b}"
+
+        self.assertEqual(
+            inject_params(
+                content,
+                params={
+                    'a': 'A',
+                },
+                raise_exception=False
+            ),
+            "a = A, b = ${param:b}"
+        )
+
+    def test_inject_settings(self):
+
+        self.assertDictEqual(
+            inject_settings(
+                OrderedDict([
+                    ('port', '${param:port}'),
+                    ('url', 'http://${param:host}:${param:port}/'),
+                    ('hosts', ['${param:host}', 'remote']),
+                    ('nested', OrderedDict([
+                        ('debug', '${param:debug}'),
+                        ('escaped', '$${param:host}'),
+                    ])),
+                ]),
+                params={
+                    'host': '${param:default_host}',
+                    'default_host': 'local"host',
+                    'port': 5555,
+                    'debug': False,
+                }
+            ),
+            {
+                'port': 5555,
+                'url': 'http://local"host:5555/',
+                'hosts': ['local"host', 'remote'],
+                'nested': {
+                    'debug': False,
+                    'escaped': '$${param:host}',
+                }
+            }
+        )